@@ -0,0 +1,254 @@
+#!/usr/bin/env python3
+#
+# API call budgets: provisioning scenarios are run against the local stand-in of the Mist and Google APIs with every
+# request of the utility recorded by method and endpoint template, and the counts are checked against per-scenario
+# budgets. The script exits with a non-zero status when a budget is exceeded, so a regression in batching or caching
+# fails the build instead of quietly costing more API calls.
+#
+# Usage: python -m benchmarks.call_budgets [--rows 1000] [--scenarios sites devices] [--verbose]
+#
+
+# Standard library imports
+import argparse
+import json
+import sys
+import tempfile
+from pathlib import Path
+from typing import Callable, Dict, List, NamedTuple, Optional
+# Module imports
+from benchmarks.fake_mist import FakeMist
+from benchmarks.provisioning import RFTEMPLATE, SITEGROUP, write_config, write_devices_csv, write_sites_csv
+from mist.transport import CallRecorder
+
+
+class Budget(NamedTuple):
+
+    """
+    Largest number of calls allowed per CSV row, plus a fixed allowance for the lookups done once per run, for the
+    calls matching a method and endpoint template
+    """
+
+    description: str
+    per_row: float
+    fixed: int = 0
+    method: Optional[str] = None
+    template: Optional[str] = None
+    google: Optional[bool] = False
+
+    def calls(self, recorder: CallRecorder) -> int:
+        return recorder.count(method=self.method, template=self.template, google=self.google)
+
+    def allowed(self, rows: int) -> float:
+        return self.per_row * rows + self.fixed
+
+
+class Scenario(NamedTuple):
+    name: str
+    description: str
+    run: Callable[['ScenarioContext'], None]
+    budgets: List[Budget]
+
+
+class ScenarioContext(NamedTuple):
+    work_dir: Path
+    fake: FakeMist
+    rows: int
+    engine: str
+    concurrency: int
+
+
+def new_mist(context: ScenarioContext):
+    # Imported here so the log file of the utility is written in the work directory
+    from mist import Mist
+    from src import logger
+    from src.config import Config
+    config = Config(filename=str(context.work_dir / "config.yml"))
+    # Reading the configuration sets the logger up again, only the errors are worth printing along with the budgets
+    logger.setLevel("ERROR")
+    for handler in logger.handlers:
+        handler.setLevel("ERROR")
+    return Mist(config=config)
+
+
+def record(context: ScenarioContext, provision: Callable, warm_up: Callable = None) -> CallRecorder:
+    """
+    Run a provisioning step with the requests of the utility recorded
+
+    :param ScenarioContext context: The scenario being run
+    :param Callable provision: Function provisioning with the Mist object given
+    :param Callable warm_up: Function run with the Mist object before the recording starts, e.g. a first provisioning
+    :return CallRecorder: The recorder of the requests sent by the provisioning step
+    """
+    mist = new_mist(context)
+    try:
+        if warm_up is not None:
+            warm_up(mist)
+        recorder = mist.api.record_calls()
+        provision(mist)
+    finally:
+        mist.api.close()
+    return recorder
+
+
+def provision_sites(context: ScenarioContext, upsert: bool = False) -> Callable:
+    from src import provision
+
+    def run(mist):
+        provision.provision_sites(csv_file=context.work_dir / "sites.csv", mist=mist, engine=context.engine,
+                                  concurrency=context.concurrency, upsert=upsert)
+    return run
+
+
+def provision_devices(context: ScenarioContext) -> Callable:
+    from src import provision
+
+    def run(mist):
+        provision.provision_devices(csv_file=context.work_dir / "devices.csv", mist=mist, engine=context.engine,
+                                    concurrency=context.concurrency)
+    return run
+
+
+def plan(context: ScenarioContext) -> Callable:
+    from src import provision
+
+    def run(mist):
+        provision.plan_provisioning(mist, sites_csv=context.work_dir / "sites.csv",
+                                    devices_csv=context.work_dir / "devices.csv")
+    return run
+
+
+def sites_scenario(context: ScenarioContext) -> CallRecorder:
+    write_sites_csv(context.work_dir / "sites.csv", context.rows)
+    return record(context, provision_sites(context))
+
+
+def devices_scenario(context: ScenarioContext) -> CallRecorder:
+    # A site per 20 devices, created before the recording starts
+    sites = write_sites_csv(context.work_dir / "sites.csv", max(1, context.rows // 20))
+    write_devices_csv(context.work_dir / "devices.csv", context.rows, sites, context.fake)
+    return record(context, provision_devices(context), warm_up=provision_sites(context))
+
+
+def upsert_scenario(context: ScenarioContext) -> CallRecorder:
+    write_sites_csv(context.work_dir / "sites.csv", context.rows)
+    return record(context, provision_sites(context, upsert=True), warm_up=provision_sites(context))
+
+
+def plan_scenario(context: ScenarioContext) -> CallRecorder:
+    sites = write_sites_csv(context.work_dir / "sites.csv", context.rows)
+    write_devices_csv(context.work_dir / "devices.csv", context.rows, sites, context.fake)
+    return record(context, plan(context))
+
+
+SCENARIOS = [
+    Scenario("sites", "new sites from a sites CSV", sites_scenario, [
+        # The sites, site groups and RF templates are listed once, the sites again to verify the new ones
+        Budget("Mist calls", 1.001, fixed=4),
+        Budget("site creations", 1, method="POST", template="orgs/{org_id}/sites"),
+        Budget("site lists", 0.001, fixed=2, method="GET", template="orgs/{org_id}/sites"),
+        Budget("site reads", 0, method="GET", template="sites/{site_id}"),
+        # Every tenth site shares its address with the previous one
+        Budget("Google calls", 1.8, fixed=2, google=True)
+    ]),
+    Scenario("devices", "claim and assign devices spread over existing sites", devices_scenario, [
+        Budget("Mist calls", 1.1),
+        Budget("inventory reads", 0, fixed=1, method="GET", template="orgs/{org_id}/inventory"),
+        Budget("inventory updates", 0.1, method="PUT", template="orgs/{org_id}/inventory"),
+        Budget("device renames", 1, method="PUT", template="sites/{site_id}/devices/{device_id}"),
+        Budget("Google calls", 0, google=True)
+    ]),
+    Scenario("upsert", "upsert of sites already up to date", upsert_scenario, [
+        Budget("Mist calls", 0, fixed=1),
+        Budget("site writes", 0, method="PUT", template="sites/{site_id}"),
+        Budget("site creations", 0, method="POST", template="orgs/{org_id}/sites"),
+        Budget("Google calls", 0, google=True)
+    ]),
+    Scenario("plan", "dry run of new sites and devices", plan_scenario, [
+        # The organization, its sites, site groups, RF templates and inventory are listed once
+        Budget("Mist calls", 0, fixed=5),
+        Budget("writes", 0, method="POST", template="orgs/{org_id}/sites"),
+        Budget("inventory writes", 0, method="POST", template="orgs/{org_id}/inventory"),
+        Budget("Google calls", 0, google=True)
+    ])
+]
+
+
+def run_scenario(scenario: Scenario, args: argparse.Namespace) -> Dict:
+    """
+    Run a scenario against a new fake server and check its budgets
+
+    :param Scenario scenario: The scenario to run
+    :param argparse.Namespace args: The harness options
+    :return Dict: The calls recorded and the budgets checked, with the exceeded ones listed under 'violations'
+    """
+    fake = FakeMist(api_token="budget", seed=args.rows).start()
+    try:
+        fake.add_sitegroup(SITEGROUP)
+        fake.add_rftemplate(RFTEMPLATE)
+        with tempfile.TemporaryDirectory(prefix=f"mist-budget-{scenario.name}-") as tmp:
+            work_dir = Path(tmp)
+            write_config(work_dir / "config.yml", fake, work_dir, page_limit=1000, concurrency=args.concurrency)
+            recorder = scenario.run(ScenarioContext(work_dir=work_dir, fake=fake, rows=args.rows, engine=args.engine,
+                                                    concurrency=args.concurrency))
+    finally:
+        fake.stop()
+    budgets = list()
+    for budget in scenario.budgets:
+        calls = budget.calls(recorder)
+        budgets.append({
+            "budget": budget.description,
+            "calls": calls,
+            "per_row": round(calls / args.rows, 4),
+            "allowed": budget.allowed(args.rows),
+            "exceeded": calls > budget.allowed(args.rows)
+        })
+    return {
+        "scenario": scenario.name,
+        "rows": args.rows,
+        "budgets": budgets,
+        "violations": [budget["budget"] for budget in budgets if budget["exceeded"]],
+        "calls": {f"{method} {template}": count for (method, template), count in sorted(recorder.calls.items())}
+    }
+
+
+def cli_parser() -> argparse.Namespace:
+    """ Parse the command-line arguments and return the values.
+
+    :return argparse.Namespace: Namespace object containing the CLI arguments
+    """
+    cli = argparse.ArgumentParser(prog="benchmarks.call_budgets",
+                                  description="Check the API calls of provisioning scenarios against budgets")
+    cli.add_argument('--rows', type=int, default=1000,
+                     help="Number of rows of the CSV files of every scenario (default: %(default)s)")
+    cli.add_argument('--scenarios', nargs='+', choices=[scenario.name for scenario in SCENARIOS],
+                     default=[scenario.name for scenario in SCENARIOS],
+                     help="Scenarios to run (default: all of them)")
+    cli.add_argument('--engine', choices=['serial', 'threads'], default="threads",
+                     help="Execution engine (default: %(default)s)")
+    cli.add_argument('--concurrency', type=int, default=10,
+                     help="Maximum number of sites or devices in flight (default: %(default)s)")
+    cli.add_argument('--verbose', action='store_true', help="Print the calls recorded by every scenario as JSON")
+    return cli.parse_args()
+
+
+def main() -> int:
+    args = cli_parser()
+    failed = False
+    for scenario in SCENARIOS:
+        if scenario.name not in args.scenarios:
+            continue
+        result = run_scenario(scenario, args)
+        status = "FAIL" if result["violations"] else "ok"
+        print(f"{status:4} {scenario.name}: {scenario.description} ({args.rows} rows)")
+        for budget in result["budgets"]:
+            marker = "!" if budget["exceeded"] else " "
+            print(f"  {marker} {budget['budget']}: {budget['calls']} calls, {budget['per_row']}/row "
+                  f"(budget {budget['allowed']:g})")
+        if args.verbose:
+            print(json.dumps(result["calls"], indent=2))
+        failed = failed or bool(result["violations"])
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
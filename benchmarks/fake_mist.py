@@ -0,0 +1,584 @@
+#!/usr/bin/env python3
+#
+# Local stand-in of the Mist and Google APIs used by the provisioning utility, for load testing offline.
+# Point the `base_url` options of the `mist` and `google` sections of the configuration file at it.
+#
+
+# Standard library imports
+import argparse
+import csv
+import hashlib
+import json
+import re
+import uuid
+from collections import Counter, deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from math import ceil
+from pathlib import Path
+from random import Random
+from threading import Lock, Thread
+from time import sleep, time
+from typing import AnyStr, Callable, Dict, List, NamedTuple, Optional, Pattern, Tuple
+from urllib.parse import parse_qs, urlparse
+
+
+class Response(NamedTuple):
+    """ Response of the fake server """
+    status: int
+    body: object
+    headers: Dict[str, str] = {}
+
+
+class Route(NamedTuple):
+    """ Endpoint of the fake server """
+    method: str
+    pattern: Pattern
+    template: str
+    handler: Callable[..., Response]
+
+
+class FakeMist(object):
+
+    """Local fake of the Mist API endpoints used by the provisioning utility and of the Google Geocoding and Time Zone APIs"""
+
+    MIST_PREFIX = "/api/v1/"
+    GOOGLE_PREFIX = "/maps/api/"
+    DEFAULT_PAGE_LIMIT = 100
+
+    org_id: str
+    api_token: str
+    latency: float = 0
+    jitter: float = 0
+    error_rate: float = 0
+    error_status: int = 503
+    max_page_limit: int = 1000
+    rate_limit: int = None
+    rate_window: float = 3600
+    calls: Counter
+    statuses: Counter
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0, org_id: str = None, api_token: str = None,
+                 latency: float = 0, jitter: float = 0, error_rate: float = 0, error_status: int = 503,
+                 max_page_limit: int = 1000, rate_limit: int = None, rate_window: float = 3600, seed: int = None):
+        """
+        Initialize the fake server, it only accepts requests once started.
+
+        :param str host: Address to listen on
+        :param int port: Port to listen on, a free port is picked when 0
+        :param str org_id: ID of the organization, a random one is generated if not set
+        :param str api_token: Mist API token expected in the Authorization header, any token is accepted if not set
+        :param float latency: Number of seconds added to every response
+        :param float jitter: Maximum number of seconds randomly added to the latency
+        :param float error_rate: Fraction of the requests answered with the error status instead of being processed
+        :param int error_status: HTTP status of the injected errors
+        :param int max_page_limit: Largest number of items returned in a page, larger limits are capped
+        :param int rate_limit: Number of Mist API calls allowed per rate window, further calls get a 429 response
+        :param float rate_window: Length of the rate window in seconds
+        :param int seed: Seed of the random number generator, for reproducible error injection
+        """
+        self.org_id = org_id or str(uuid.uuid4())
+        self.api_token = api_token
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self.max_page_limit = max_page_limit
+        self.rate_limit = rate_limit
+        self.rate_window = rate_window
+        self.calls = Counter()
+        self.statuses = Counter()
+        self.__random = Random(seed)
+        self.__window = deque()
+        self.__lock = Lock()
+        self.__sites: Dict[str, Dict] = dict()
+        self.__sitegroups: Dict[str, Dict] = dict()
+        self.__rftemplates: Dict[str, Dict] = dict()
+        self.__inventory: Dict[str, Dict] = dict()
+        self.__claimable: Dict[str, Dict] = dict()
+        org = f"orgs/{re.escape(self.org_id)}"
+        self.__routes: List[Route] = [
+            self.__route("GET", r"self", "self", self.__get_self),
+            self.__route("GET", org, "orgs/{org_id}", self.__get_org),
+            self.__route("GET", rf"{org}/sites", "orgs/{org_id}/sites", self.__list(self.__sites)),
+            self.__route("POST", rf"{org}/sites", "orgs/{org_id}/sites", self.__create_site),
+            self.__route("GET", rf"{org}/sitegroups", "orgs/{org_id}/sitegroups", self.__list(self.__sitegroups)),
+            self.__route("POST", rf"{org}/sitegroups", "orgs/{org_id}/sitegroups", self.__create(self.__sitegroups)),
+            self.__route("GET", rf"{org}/sitegroups/([^/]+)", "orgs/{org_id}/sitegroups/{sitegroup_id}",
+                         self.__get(self.__sitegroups)),
+            self.__route("GET", rf"{org}/rftemplates", "orgs/{org_id}/rftemplates", self.__list(self.__rftemplates)),
+            self.__route("POST", rf"{org}/rftemplates", "orgs/{org_id}/rftemplates", self.__create(self.__rftemplates)),
+            self.__route("GET", rf"{org}/rftemplates/([^/]+)", "orgs/{org_id}/rftemplates/{rftemplate_id}",
+                         self.__get(self.__rftemplates)),
+            self.__route("GET", rf"{org}/inventory", "orgs/{org_id}/inventory", self.__list_inventory),
+            self.__route("POST", rf"{org}/inventory", "orgs/{org_id}/inventory", self.__claim),
+            self.__route("PUT", rf"{org}/inventory", "orgs/{org_id}/inventory", self.__update_inventory),
+            self.__route("GET", r"sites/([^/]+)", "sites/{site_id}", self.__get(self.__sites)),
+            self.__route("PUT", r"sites/([^/]+)", "sites/{site_id}", self.__update_site),
+            self.__route("DELETE", r"sites/([^/]+)", "sites/{site_id}", self.__delete_site),
+            self.__route("GET", r"sites/([^/]+)/setting", "sites/{site_id}/setting", self.__get_setting),
+            self.__route("PUT", r"sites/([^/]+)/devices/([^/]+)", "sites/{site_id}/devices/{device_id}",
+                         self.__update_device)
+        ]
+        self.__server = ThreadingHTTPServer((host, port), self.__handler())
+        self.__server.daemon_threads = True
+        self.__thread: Optional[Thread] = None
+
+    @staticmethod
+    def __route(method: str, pattern: str, template: str, handler: Callable[..., Response]) -> Route:
+        return Route(method=method, pattern=re.compile(f"^{pattern}$"), template=template, handler=handler)
+
+    # Server
+
+    def start(self) -> 'FakeMist':
+        """
+        Serve requests from a background thread
+
+        :return FakeMist: The started server
+        """
+        self.__thread = Thread(target=self.__server.serve_forever, name="fake-mist", daemon=True)
+        self.__thread.start()
+        return self
+
+    def serve_forever(self):
+        self.__server.serve_forever()
+
+    def stop(self):
+        self.__server.shutdown()
+        self.__server.server_close()
+
+    @property
+    def port(self) -> int:
+        return self.__server.server_address[1]
+
+    @property
+    def url(self) -> str:
+        return f"http://{self.__server.server_address[0]}:{self.port}"
+
+    @property
+    def base_url(self) -> str:
+        """ Value of the `base_url` option of the `mist` section of the configuration file """
+        return f"{self.url}{self.MIST_PREFIX}{{}}"
+
+    @property
+    def google_base_url(self) -> str:
+        """ Value of the `base_url` option of the `google` section of the configuration file """
+        return self.url
+
+    def __handler(self):
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+            # Send the headers and the body of a response in one segment, delayed ACKs would add 40ms otherwise
+            wbufsize = -1
+            disable_nagle_algorithm = True
+
+            def log_message(self, *args):
+                pass
+
+            def handle_method(self):
+                length = int(self.headers.get('Content-Length') or 0)
+                body = self.rfile.read(length) if length else b""
+                response = fake.handle(self.command, self.path, self.headers.get('Authorization'), body)
+                data = json.dumps(response.body).encode()
+                self.send_response(response.status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                for header, value in response.headers.items():
+                    self.send_header(header, str(value))
+                self.end_headers()
+                self.wfile.write(data)
+
+            do_GET = do_POST = do_PUT = do_DELETE = handle_method
+
+        return Handler
+
+    def handle(self, method: str, path: str, authorization: Optional[str], body: bytes) -> Response:
+        """
+        Answer a request, with the configured latency, errors and rate limit applied
+
+        :param str method: HTTP method of the request
+        :param str path: Path and query string of the request
+        :param Optional[str] authorization: Value of the Authorization header
+        :param bytes body: Body of the request
+        :return Response: The response
+        """
+        parsed = urlparse(path)
+        query = {key: values[0] for key, values in parse_qs(parsed.query).items()}
+        if parsed.path.startswith(self.GOOGLE_PREFIX):
+            endpoint = parsed.path[len(self.GOOGLE_PREFIX):]
+            template, response = f"google/{endpoint}", self.__google(endpoint, query)
+        elif parsed.path == "/_fake/stats":
+            return Response(200, self.stats())
+        elif parsed.path.startswith(self.MIST_PREFIX):
+            template, response = self.__mist(method, parsed.path[len(self.MIST_PREFIX):], query, authorization, body)
+        else:
+            template, response = parsed.path, Response(404, {"detail": "Not found"})
+        with self.__lock:
+            self.calls[(method, template)] += 1
+            self.statuses[response.status] += 1
+        if self.latency or self.jitter:
+            sleep(self.latency + self.__random.uniform(0, self.jitter))
+        return response
+
+    def __mist(self, method: str, url: str, query: Dict[str, str], authorization: Optional[str],
+               body: bytes) -> Tuple[str, Response]:
+        for route in self.__routes:
+            match = route.pattern.match(url)
+            if match and route.method == method:
+                break
+        else:
+            return url, Response(404, {"detail": f"Unknown endpoint {method} {url}"})
+        if self.api_token and authorization != f"Token {self.api_token}":
+            return route.template, Response(401, {"detail": "Authentication credentials were not provided."})
+        with self.__lock:
+            retry_after = self.__throttle()
+            failed = self.error_rate and self.__random.random() < self.error_rate
+        if retry_after:
+            return route.template, Response(429, {"detail": "Too many requests"}, {"Retry-After": retry_after})
+        if failed:
+            return route.template, Response(self.error_status, {"detail": "Injected error"})
+        try:
+            data = json.loads(body) if body else None
+        except ValueError:
+            return route.template, Response(400, {"detail": "Invalid JSON body"})
+        with self.__lock:
+            return route.template, route.handler(*match.groups(), query=query, body=data)
+
+    def __throttle(self) -> int:
+        # Sliding window of the Mist API calls, returns the number of seconds to wait when the limit is reached
+        if not self.rate_limit:
+            return 0
+        now = time()
+        while self.__window and self.__window[0] <= now - self.rate_window:
+            self.__window.popleft()
+        if len(self.__window) >= self.rate_limit:
+            return max(1, ceil(self.__window[0] + self.rate_window - now))
+        self.__window.append(now)
+        return 0
+
+    def stats(self) -> Dict:
+        """
+        Requests answered so far
+
+        :return Dict: Number of requests per endpoint template and per status code
+        """
+        with self.__lock:
+            return {
+                "calls": {f"{method} {template}": count for (method, template), count in self.calls.items()},
+                "statuses": {str(status): count for status, count in self.statuses.items()}
+            }
+
+    # Data
+
+    def add_site(self, name: str, **fields) -> Dict:
+        """
+        Add an existing site to the organization
+
+        :param str name: Name of the site
+        :param fields: Other fields of the site
+        :return Dict: The site
+        """
+        with self.__lock:
+            return self.__create(self.__sites)(body=dict(fields, name=name)).body
+
+    def add_sitegroup(self, name: str) -> Dict:
+        with self.__lock:
+            return self.__create(self.__sitegroups)(body={"name": name}).body
+
+    def add_rftemplate(self, name: str, **fields) -> Dict:
+        with self.__lock:
+            return self.__create(self.__rftemplates)(body=dict(fields, name=name)).body
+
+    def add_device(self, serial: str, mac: str, claim_code: str = None, claimed: bool = False, model: str = "AP43",
+                   site_id: str = None, name: str = None) -> Dict:
+        """
+        Add a device, either to the inventory of the organization or to the devices which can be claimed
+
+        :param str serial: Serial number of the device
+        :param str mac: MAC address of the device
+        :param str claim_code: Claim code of the device
+        :param bool claimed: Whether the device is already in the inventory, always the case without a claim code
+        :param str model: Model of the device
+        :param str site_id: ID of the site the device is assigned to
+        :param str name: Name of the device
+        :return Dict: The inventory entry of the device
+        """
+        mac = self.__normalize_mac(mac)
+        device = {
+            "id": f"00000000-0000-0000-1000-{mac}",
+            "serial": serial,
+            "mac": mac,
+            "magic": claim_code.upper() if claim_code else None,
+            "model": model,
+            "type": "ap",
+            "site_id": site_id,
+            "name": name,
+            "org_id": self.org_id,
+            "connected": False,
+            "created_time": int(time()),
+            "modified_time": int(time())
+        }
+        with self.__lock:
+            if claim_code and not claimed:
+                self.__claimable[device['magic']] = device
+            else:
+                self.__inventory[mac] = device
+        return device
+
+    def load_devices_csv(self, csv_file: AnyStr, claimed: bool = False) -> int:
+        """
+        Add the devices of a devices CSV file of the provisioning utility
+
+        :param AnyStr csv_file: Path of the CSV file
+        :param bool claimed: Whether the devices with a claim code are already in the inventory
+        :return int: The number of devices added
+        """
+        count = 0
+        with Path(csv_file).expanduser().open('r') as csv_stream:
+            for row in csv.DictReader(csv_stream):
+                if row.get('serial') and row.get('mac'):
+                    self.add_device(serial=row['serial'], mac=row['mac'], claim_code=row.get('claim_code') or None,
+                                    claimed=claimed)
+                    count += 1
+        return count
+
+    @staticmethod
+    def __normalize_mac(mac: str) -> str:
+        return str(mac).lower().replace(':', '').replace('-', '').replace('.', '')
+
+    # Mist API endpoints
+
+    def __get_self(self, query: Dict, body: object) -> Response:
+        return Response(200, {
+            "email": "load-test@example.com",
+            "privileges": [{"scope": "org", "role": "admin", "org_id": self.org_id, "name": "Load Test"}]
+        })
+
+    def __get_org(self, query: Dict, body: object) -> Response:
+        return Response(200, {"id": self.org_id, "name": "Load Test", "allow_mist": False, "session_expiry": 1440})
+
+    def __page(self, items: List[Dict], query: Dict[str, str]) -> Response:
+        limit = min(int(query.get('limit') or self.DEFAULT_PAGE_LIMIT), self.max_page_limit)
+        page = max(1, int(query.get('page') or 1))
+        headers = {"X-Page-Total": len(items), "X-Page-Limit": limit, "X-Page-Page": page}
+        return Response(200, items[(page - 1) * limit:page * limit], headers)
+
+    def __list(self, collection: Dict[str, Dict]) -> Callable[..., Response]:
+        def handler(query: Dict, body: object) -> Response:
+            return self.__page(list(collection.values()), query)
+        return handler
+
+    def __get(self, collection: Dict[str, Dict]) -> Callable[..., Response]:
+        def handler(object_id: str, query: Dict, body: object) -> Response:
+            if object_id not in collection:
+                return Response(404, {"detail": "Object not found"})
+            return Response(200, collection[object_id])
+        return handler
+
+    def __create(self, collection: Dict[str, Dict]) -> Callable[..., Response]:
+        def handler(query: Dict = None, body: object = None) -> Response:
+            if not isinstance(body, dict) or not body.get('name'):
+                return Response(400, {"detail": "Field 'name' is required"})
+            now = int(time())
+            item = dict(body, id=str(uuid.uuid4()), org_id=self.org_id, created_time=now, modified_time=now)
+            collection[item['id']] = item
+            return Response(200, item)
+        return handler
+
+    def __create_site(self, query: Dict, body: object) -> Response:
+        response = self.__create(self.__sites)(body=body)
+        if response.status == 200:
+            response.body.setdefault('sitegroup_ids', [])
+        return response
+
+    def __update_site(self, site_id: str, query: Dict, body: object) -> Response:
+        if site_id not in self.__sites:
+            return Response(404, {"detail": "Site not found"})
+        site = self.__sites[site_id]
+        site.update({k: v for k, v in (body or {}).items() if k not in ('id', 'org_id')}, modified_time=int(time()))
+        return Response(200, site)
+
+    def __delete_site(self, site_id: str, query: Dict, body: object) -> Response:
+        if self.__sites.pop(site_id, None) is None:
+            return Response(404, {"detail": "Site not found"})
+        for device in self.__inventory.values():
+            if device['site_id'] == site_id:
+                device['site_id'] = None
+        return Response(200, {})
+
+    def __get_setting(self, site_id: str, query: Dict, body: object) -> Response:
+        if site_id not in self.__sites:
+            return Response(404, {"detail": "Site not found"})
+        return Response(200, {"site_id": site_id})
+
+    def __list_inventory(self, query: Dict, body: object) -> Response:
+        devices = list(self.__inventory.values())
+        for field in ('serial', 'mac', 'site_id', 'model', 'type'):
+            if field in query:
+                devices = [device for device in devices if device.get(field) == query[field]]
+        return self.__page(devices, query)
+
+    def __claim(self, query: Dict, body: object) -> Response:
+        if not isinstance(body, list):
+            return Response(400, {"detail": "A list of claim codes is expected"})
+        result = {"op": "claim", "added": [], "duplicated": [], "error": [], "inventory_added": [],
+                  "inventory_duplicated": []}
+        claimed = {device['magic']: device for device in self.__inventory.values() if device.get('magic')}
+        for claim_code in body:
+            magic = str(claim_code).upper()
+            if magic in self.__claimable:
+                device = self.__claimable.pop(magic)
+                self.__inventory[device['mac']] = device
+                claimed[magic] = device
+                result['added'].append(magic)
+                result['inventory_added'].append(device)
+            elif magic in claimed:
+                result['duplicated'].append(magic)
+                result['inventory_duplicated'].append(claimed[magic])
+            else:
+                result['error'].append(magic)
+        return Response(200, result)
+
+    def __update_inventory(self, query: Dict, body: object) -> Response:
+        if not isinstance(body, dict) or body.get('op') not in ('assign', 'unassign', 'delete'):
+            return Response(400, {"detail": "Unknown inventory operation"})
+        result = {"op": body['op'], "success": [], "error": [], "reason": []}
+        if body['op'] == 'delete':
+            macs = set(self.__normalize_mac(mac) for mac in body.get('macs') or [])
+            serials = set(body.get('serials') or [])
+            for mac, device in list(self.__inventory.items()):
+                if mac in macs or device['serial'] in serials:
+                    del self.__inventory[mac]
+                    result['success'].append(device['serial'])
+            return Response(200, result)
+        site_id = body.get('site_id')
+        if body['op'] == 'assign' and site_id not in self.__sites:
+            return Response(400, {"detail": "Site not found"})
+        for mac in body.get('macs') or []:
+            device = self.__inventory.get(self.__normalize_mac(mac))
+            if device is None:
+                result['error'].append(mac)
+                result['reason'].append("Device not found")
+            elif body['op'] == 'assign' and body.get('no_reassign') and device['site_id'] not in (None, site_id):
+                result['error'].append(mac)
+                result['reason'].append("Device already assigned")
+            else:
+                device['site_id'] = site_id if body['op'] == 'assign' else None
+                result['success'].append(mac)
+        return Response(200, result)
+
+    def __update_device(self, site_id: str, device_id: str, query: Dict, body: object) -> Response:
+        device = self.__inventory.get(self.__normalize_mac(device_id.rsplit('-', 1)[-1]))
+        if device is None or device['site_id'] != site_id:
+            return Response(404, {"detail": "Device not found"})
+        device.update({k: v for k, v in (body or {}).items() if k in ('name', 'notes', 'height', 'orientation')},
+                      modified_time=int(time()))
+        return Response(200, device)
+
+    # Google endpoints
+
+    def __google(self, endpoint: str, query: Dict[str, str]) -> Response:
+        with self.__lock:
+            failed = self.error_rate and self.__random.random() < self.error_rate
+        if failed:
+            return Response(self.error_status, {"status": "UNKNOWN_ERROR"})
+        if endpoint == "geocode/json":
+            return self.__geocode(query.get('address', ''))
+        if endpoint == "timezone/json":
+            return self.__timezone(query.get('location', ''))
+        return Response(404, {"status": "NOT_FOUND"})
+
+    @staticmethod
+    def __geocode(address: str) -> Response:
+        # Locations are derived from the address so every run geocodes the same address to the same place
+        if not address.strip():
+            return Response(200, {"status": "ZERO_RESULTS", "results": []})
+        digest = hashlib.sha256(address.strip().lower().encode()).digest()
+        lat = round(int.from_bytes(digest[:4], 'big') / 2 ** 32 * 120 - 60, 6)
+        lng = round(int.from_bytes(digest[4:8], 'big') / 2 ** 32 * 360 - 180, 6)
+        location = {"lat": lat, "lng": lng}
+        result = {
+            "formatted_address": address.strip(),
+            "geometry": {
+                "location": location,
+                "location_type": "ROOFTOP",
+                "viewport": {"northeast": location, "southwest": location}
+            },
+            "address_components": [{"long_name": "United States", "short_name": "US", "types": ["country", "political"]}],
+            "place_id": digest.hex()[:27],
+            "types": ["street_address"]
+        }
+        return Response(200, {"status": "OK", "results": [result]})
+
+    @staticmethod
+    def __timezone(location: str) -> Response:
+        try:
+            lng = float(location.split(',')[1])
+        except (IndexError, ValueError):
+            return Response(200, {"status": "INVALID_REQUEST"})
+        # Etc/GMT zones have their sign inverted: Etc/GMT+5 is 5 hours behind UTC
+        offset = round(lng / 15)
+        timezone = f"Etc/GMT{'+' if offset < 0 else '-'}{abs(offset)}" if offset else "Etc/GMT"
+        return Response(200, {"status": "OK", "timeZoneId": timezone, "rawOffset": offset * 3600, "dstOffset": 0})
+
+    def __str__(self):
+        return f"<{self.__class__.__name__} object - URL: {self.url}, Org: {self.org_id}>"
+
+
+def cli_parser() -> argparse.Namespace:
+    """ Parse the command-line arguments and return the values.
+
+    :return argparse.Namespace: Namespace object containing the CLI arguments
+    """
+    cli = argparse.ArgumentParser(prog="fake_mist",
+                                  description="Local stand-in of the Mist and Google APIs for load testing")
+    cli.add_argument('--host', default="127.0.0.1", help="Address to listen on (default: %(default)s)")
+    cli.add_argument('--port', type=int, default=8080, help="Port to listen on (default: %(default)s)")
+    cli.add_argument('--org-id', help="ID of the organization (default: random)")
+    cli.add_argument('--api-token', help="Mist API token expected from the clients (default: any token)")
+    cli.add_argument('--latency', type=float, default=0, help="Seconds added to every response (default: %(default)s)")
+    cli.add_argument('--jitter', type=float, default=0,
+                     help="Maximum seconds randomly added to the latency (default: %(default)s)")
+    cli.add_argument('--error-rate', type=float, default=0,
+                     help="Fraction of the requests answered with an error (default: %(default)s)")
+    cli.add_argument('--error-status', type=int, default=503,
+                     help="HTTP status of the injected errors (default: %(default)s)")
+    cli.add_argument('--max-page-limit', type=int, default=1000,
+                     help="Largest number of items per page (default: %(default)s)")
+    cli.add_argument('--rate-limit', type=int,
+                     help="Number of Mist API calls allowed per rate window before 429 responses (default: no limit)")
+    cli.add_argument('--rate-window', type=float, default=3600,
+                     help="Length of the rate window in seconds (default: %(default)s)")
+    cli.add_argument('--seed', type=int, help="Seed of the injected errors and jitter")
+    cli.add_argument('--devices', type=Path, metavar="CSV file",
+                     help="Devices CSV file, its devices can be claimed or are already in the inventory")
+    cli.add_argument('--sitegroup', action='append', default=[], help="Name of an existing site group, repeatable")
+    cli.add_argument('--rftemplate', action='append', default=[], help="Name of an existing RF template, repeatable")
+    return cli.parse_args()
+
+
+def main():
+    args = cli_parser()
+    fake = FakeMist(host=args.host, port=args.port, org_id=args.org_id, api_token=args.api_token,
+                    latency=args.latency, jitter=args.jitter, error_rate=args.error_rate,
+                    error_status=args.error_status, max_page_limit=args.max_page_limit, rate_limit=args.rate_limit,
+                    rate_window=args.rate_window, seed=args.seed)
+    for name in args.sitegroup:
+        fake.add_sitegroup(name)
+    for name in args.rftemplate:
+        fake.add_rftemplate(name)
+    if args.devices:
+        print(f"Loaded {fake.load_devices_csv(args.devices)} devices from {args.devices}.")
+    print(f"Serving organization {fake.org_id} on {fake.url}, configure:")
+    print(f"  mist.base_url: {fake.base_url}\n  mist.org_id: {fake.org_id}\n  google.base_url: {fake.google_base_url}")
+    try:
+        fake.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        print(json.dumps(fake.stats(), indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,276 @@
+#!/usr/bin/env python3
+#
+# End-to-end provisioning benchmark: synthetic sites and devices CSV files of increasing size are provisioned against
+# the local stand-in of the Mist and Google APIs, and the wall time, request rate, calls per row and peak RSS of every
+# run are reported as JSON so runs can be compared across commits.
+#
+# Usage: python -m benchmarks.provisioning --sizes 100 1000 --latency 0.02 --engine threads --output results.json
+#
+
+# Standard library imports
+import argparse
+import csv
+import json
+import os
+import platform
+import resource
+import subprocess
+import sys
+import tempfile
+from datetime import datetime, timezone
+from pathlib import Path
+from time import perf_counter
+from typing import AnyStr, Dict, List
+from urllib.request import urlopen
+# Module imports
+from benchmarks.fake_mist import FakeMist
+
+DEFAULT_SIZES = (100, 1000, 10000, 50000)
+REPOSITORY = Path(__file__).absolute().parent.parent
+SITEGROUP = "Benchmark Sites"
+RFTEMPLATE = "Benchmark RF"
+
+
+def write_sites_csv(csv_file: AnyStr, rows: int) -> List[str]:
+    """
+    Write a synthetic sites CSV file
+
+    Every tenth site shares its address with the previous one, like branches in the same building.
+
+    :param AnyStr csv_file: Path of the CSV file
+    :param int rows: Number of sites
+    :return List[str]: The names of the sites
+    """
+    names = list()
+    with Path(csv_file).open('w', newline='') as csv_stream:
+        writer = csv.writer(csv_stream)
+        writer.writerow(['name', 'address', 'rftemplate', 'sitegroups'])
+        for row in range(rows):
+            name = f"Site {row:06d}"
+            building = row - 1 if row % 10 == 9 else row
+            writer.writerow([name, f"{building} Benchmark Avenue, Springfield", RFTEMPLATE if row % 2 else None,
+                             SITEGROUP if row % 3 == 0 else None])
+            names.append(name)
+    return names
+
+
+def write_devices_csv(csv_file: AnyStr, rows: int, sites: List[str], fake: FakeMist, claimed_every: int = 4):
+    """
+    Write a synthetic devices CSV file and add its devices to the fake server
+
+    Every `claimed_every` device is already in the inventory, the other ones are claimed with their claim code.
+
+    :param AnyStr csv_file: Path of the CSV file
+    :param int rows: Number of devices
+    :param List[str] sites: Names of the sites the devices are spread over
+    :param FakeMist fake: The fake server the devices are added to
+    :param int claimed_every: Period of the devices already in the inventory
+    """
+    with Path(csv_file).open('w', newline='') as csv_stream:
+        writer = csv.writer(csv_stream)
+        writer.writerow(['hostname', 'site_name', 'mac', 'serial', 'claim_code'])
+        for row in range(rows):
+            mac = f"5c5b35{row:06x}"
+            serial = f"A{row:012d}"
+            claim_code = None if row % claimed_every == 0 else f"BENCH{row:010d}"
+            fake.add_device(serial=serial, mac=mac, claim_code=claim_code)
+            writer.writerow([f"AP-{row:06d}", sites[row % len(sites)], mac, serial, claim_code])
+
+
+def write_config(config_file: AnyStr, fake: FakeMist, work_dir: Path, page_limit: int, concurrency: int):
+    config = {
+        "mist": {
+            "api_token": fake.api_token,
+            "org_id": fake.org_id,
+            "base_url": fake.base_url,
+            "cache_timeout": 30,
+            "overwrite_device": True,
+            "page_limit": page_limit,
+            "pool_size": max(10, concurrency),
+            # The client side limits would throttle large runs, only the fake server limits the rate when asked to
+            "rate_limit": 10 ** 9,
+            "snapshot_file": str(work_dir / "mist_snapshot.sqlite")
+        },
+        "google": {
+            "api_token": "benchmark",
+            "base_url": fake.google_base_url,
+            "rate_limit": 10 ** 6,
+            "cache_file": str(work_dir / "geocache.sqlite")
+        }
+    }
+    # JSON is a subset of YAML
+    Path(config_file).write_text(json.dumps(config, indent=2))
+
+
+def fake_stats(url: str) -> Dict:
+    with urlopen(f"{url}/_fake/stats") as response:
+        return json.loads(response.read())
+
+
+def phase_result(rows: int, wall_time: float, before: Dict, after: Dict) -> Dict:
+    """
+    Compute the metrics of a provisioning phase from the request counts of the fake server
+
+    :param int rows: Number of CSV rows provisioned
+    :param float wall_time: Number of seconds the phase took
+    :param Dict before: Statistics of the fake server before the phase
+    :param Dict after: Statistics of the fake server after the phase
+    :return Dict: The metrics of the phase
+    """
+    calls = {endpoint: count - before['calls'].get(endpoint, 0) for endpoint, count in after['calls'].items()}
+    calls = {endpoint: count for endpoint, count in sorted(calls.items()) if count}
+    statuses = {status: count - before['statuses'].get(status, 0) for status, count in after['statuses'].items()}
+    mist_calls = sum(count for endpoint, count in calls.items() if not endpoint.split(' ', 1)[1].startswith('google/'))
+    google_calls = sum(calls.values()) - mist_calls
+    # ru_maxrss is in kilobytes on Linux and in bytes on macOS
+    peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / (1024 ** 2 if sys.platform == 'darwin' else 1024)
+    return {
+        "rows": rows,
+        "wall_time": round(wall_time, 3),
+        "requests": mist_calls + google_calls,
+        "requests_per_second": round((mist_calls + google_calls) / wall_time, 1) if wall_time else None,
+        "mist_calls": mist_calls,
+        "google_calls": google_calls,
+        "calls_per_row": round(mist_calls / rows, 3) if rows else None,
+        "peak_rss_mb": round(peak_rss, 1),
+        "statuses": {status: count for status, count in statuses.items() if count},
+        "calls": calls
+    }
+
+
+def run_provisioning(work_dir: Path, fake_url: str, rows: int, engine: str, concurrency: int,
+                     log_level: str = "WARNING") -> Dict:
+    """
+    Provision the CSV files of a work directory, in the process measured
+
+    :param Path work_dir: Directory holding the configuration and CSV files
+    :param str fake_url: URL of the fake server
+    :param int rows: Number of rows of the CSV files
+    :param str engine: Execution engine
+    :param int concurrency: Maximum number of sites or devices in flight
+    :param str log_level: Logging level of the utility
+    :return Dict: The metrics of the sites and devices phases
+    """
+    # Imported here so the log file of the utility is written in the work directory
+    from mist import Mist
+    from src import logger
+    from src.config import Config
+    from src.provision import provision_devices, provision_sites
+    config = Config(filename=str(work_dir / "config.yml"))
+    # Reading the configuration sets the logger up again, DEBUG lines would be measured along with the API calls
+    logger.setLevel(log_level)
+    for handler in logger.handlers:
+        handler.setLevel(log_level)
+    mist = Mist(config=config)
+    result = dict()
+    for phase, provision in (('sites', provision_sites), ('devices', provision_devices)):
+        before = fake_stats(fake_url)
+        start = perf_counter()
+        provision(csv_file=work_dir / f"{phase}.csv", mist=mist, engine=engine, concurrency=concurrency)
+        result[phase] = phase_result(rows, perf_counter() - start, before, fake_stats(fake_url))
+    mist.api.close()
+    return result
+
+
+def run_size(rows: int, args: argparse.Namespace) -> Dict:
+    """
+    Generate the CSV files of a size and provision them in a new process against a new fake server
+
+    :param int rows: Number of sites and of devices
+    :param argparse.Namespace args: The benchmark options
+    :return Dict: The metrics of the run
+    """
+    fake = FakeMist(api_token="benchmark", latency=args.latency, jitter=args.jitter, error_rate=args.error_rate,
+                    rate_limit=args.rate_limit, rate_window=args.rate_window, seed=rows).start()
+    try:
+        fake.add_sitegroup(SITEGROUP)
+        fake.add_rftemplate(RFTEMPLATE)
+        with tempfile.TemporaryDirectory(prefix=f"mist-benchmark-{rows}-") as tmp:
+            work_dir = Path(tmp)
+            sites = write_sites_csv(work_dir / "sites.csv", rows)
+            write_devices_csv(work_dir / "devices.csv", rows, sites, fake)
+            write_config(work_dir / "config.yml", fake, work_dir, args.page_limit, args.concurrency)
+            # A new process per size so the peak RSS of every size is measured on its own
+            child = subprocess.run([sys.executable, "-m", "benchmarks.provisioning", "--child", str(work_dir),
+                                    "--fake-url", fake.url, "--sizes", str(rows), "--engine", args.engine,
+                                    "--concurrency", str(args.concurrency), "--log-level", args.log_level],
+                                   cwd=str(work_dir), env=dict(os.environ, PYTHONPATH=str(REPOSITORY)), capture_output=True,
+                                   text=True)
+            if child.returncode != 0:
+                raise RuntimeError(f"Benchmark of {rows} rows failed:\n{child.stderr[-4000:]}")
+            result = json.loads((work_dir / "result.json").read_text())
+    finally:
+        fake.stop()
+    return dict(rows=rows, **result)
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], cwd=str(REPOSITORY), capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def cli_parser() -> argparse.Namespace:
+    """ Parse the command-line arguments and return the values.
+
+    :return argparse.Namespace: Namespace object containing the CLI arguments
+    """
+    cli = argparse.ArgumentParser(prog="benchmarks.provisioning",
+                                  description="End-to-end provisioning benchmark against a local fake Mist API")
+    cli.add_argument('--sizes', type=int, nargs='+', default=list(DEFAULT_SIZES),
+                     help="Numbers of sites and devices to provision (default: %(default)s)")
+    cli.add_argument('--engine', choices=['serial', 'threads'], default="threads",
+                     help="Execution engine (default: %(default)s)")
+    cli.add_argument('--concurrency', type=int, default=10,
+                     help="Maximum number of sites or devices in flight (default: %(default)s)")
+    cli.add_argument('--latency', type=float, default=0.02,
+                     help="Seconds added to every response of the fake server (default: %(default)s)")
+    cli.add_argument('--jitter', type=float, default=0,
+                     help="Maximum seconds randomly added to the latency (default: %(default)s)")
+    cli.add_argument('--error-rate', type=float, default=0,
+                     help="Fraction of the requests answered with an error (default: %(default)s)")
+    cli.add_argument('--rate-limit', type=int,
+                     help="Number of Mist API calls allowed by the fake server per rate window (default: no limit)")
+    cli.add_argument('--rate-window', type=float, default=3600,
+                     help="Length of the rate window in seconds (default: %(default)s)")
+    cli.add_argument('--page-limit', type=int, default=1000,
+                     help="Number of items per page requested by the utility (default: %(default)s)")
+    cli.add_argument('--log-level', choices=['DEBUG', 'INFO', 'WARNING', 'ERROR'], default="WARNING",
+                     help="Logging level of the utility during the runs (default: %(default)s)")
+    cli.add_argument('--output', type=Path, help="Path of the JSON results file (default: standard output)")
+    cli.add_argument('--child', type=Path, help=argparse.SUPPRESS)
+    cli.add_argument('--fake-url', help=argparse.SUPPRESS)
+    return cli.parse_args()
+
+
+def main():
+    args = cli_parser()
+    if args.child:
+        result = run_provisioning(args.child, args.fake_url, args.sizes[0], args.engine, args.concurrency,
+                                  args.log_level)
+        (args.child / "result.json").write_text(json.dumps(result))
+        return
+    runs = list()
+    for rows in args.sizes:
+        print(f"Provisioning {rows} sites and {rows} devices...", file=sys.stderr)
+        runs.append(run_size(rows, args))
+        print(f"  sites: {runs[-1]['sites']['wall_time']}s, devices: {runs[-1]['devices']['wall_time']}s",
+              file=sys.stderr)
+    results = {
+        "commit": git_commit(),
+        "date": datetime.now(timezone.utc).isoformat(timespec='seconds'),
+        "python": platform.python_version(),
+        "parameters": {k: v for k, v in vars(args).items() if k not in ('output', 'child', 'fake_url', 'sizes')},
+        "runs": runs
+    }
+    output = json.dumps(results, indent=2, default=str)
+    if args.output:
+        args.output.write_text(output)
+    else:
+        print(output)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,26 +1,32 @@
 import mist.api
+import mist.inventory
 from typing import Dict, List, Optional, Union
 from mist import logger
+from mist.model import Model
 
 
-class AccessPoint(object):
+class AccessPoint(Model):
     """Mist Access Point Object"""
 
+    __slots__ = ('hostname', 'serial', 'org_id', 'api', 'name', 'site_id', 'mac', 'claim_code')
+
     hostname: str
     serial: str
     org_id: str
     api: mist.api.API
-    name: str = None
-    site_id: str = None
-    mac: str = None
+    name: str
+    site_id: str
+    mac: str
+    claim_code: str
 
     def __init__(self, hostname: str, serial: str, org_id: str, api: mist.api.API, **kwargs):
         self.hostname = hostname
         self.serial = serial
         self.org_id = org_id
         self.api = api
-        for k, v in kwargs.items():
-            setattr(self, k, v)
+        self.name = self.site_id = self.mac = self.claim_code = None
+        super(AccessPoint, self).__init__()
+        self.set_attributes(**kwargs)
         if self.name and self.site_id and self.mac and (self.hostname != self.name):
             self.rename(self.hostname)
 
@@ -29,7 +35,7 @@ class AccessPoint(object):
             magic = claim_code
         elif hasattr(self, 'magic'):
             magic = self.magic
-        elif hasattr(self, 'claim_code'):
+        elif self.claim_code:
             magic = self.claim_code
         else:
             raise ValueError("No claim code provided.")
@@ -47,8 +53,7 @@ class AccessPoint(object):
             for device in data['inventory_added']:
                 if device['mac'] == self.mac:
                     logger.debug("Updating device attributes...")
-                    for k, v in device.items():
-                        setattr(self, k, v)
+                    self.set_attributes(**device)
                     return True
         else:
             return False
@@ -86,7 +91,13 @@ class AccessPoint(object):
                            "Device must have a site ID or MAC address assigned.")
             return False
 
-    def update_from_org_inventory(self) -> bool:
+    def update_from_org_inventory(self, inventory: mist.inventory.Inventory = None) -> bool:
+        if inventory is not None:
+            device = inventory.find(serial=self.serial, mac=self.mac)
+            if device is None:
+                return False
+            self.set_attributes(**device.to_dict())
+            return True
         url = f"orgs/{self.org_id}/inventory?serial={self.serial}"
         try:
             res = self.api.http_get__(url=url)
@@ -99,8 +110,7 @@ class AccessPoint(object):
         data = res.json()
         if len(data) == 0:
             return False
-        for k, v in data[0].items():
-            setattr(self, k, v)
+        self.set_attributes(**data[0])
         return True
 
     def assign_to_site(self, site_id: str, no_reassign: bool = False) -> (bool, Optional[Union[Dict, List]]):
@@ -124,7 +134,7 @@ class AccessPoint(object):
 
     @property
     def device_id(self):
-        if hasattr(self, 'mac') and self.mac:
+        if self.mac:
             return f"00000000-0000-0000-1000-{self.mac.lower()}"
         else:
             return None
@@ -1,9 +1,20 @@
-from typing import Dict, List, Union
+from typing import Dict, Iterator, List, Optional, Union
 from enum import Enum
 import requests
 import json
+from hashlib import sha256
+from threading import Lock, Thread
+from time import sleep
 from mist import logger
+from mist.metrics import MeasuredAdapter, Metrics
+from mist.ratelimit import RateLimitedAdapter, RateLimiter
+from mist.retry import RetryPolicy
+from mist.snapshot import OrgSnapshot
+from mist.transport import CallRecorder, RecordingTransport
 from src.config import Config
+from src.geocache import GeoCache
+from src.tzresolver import TimezoneResolver
+from src.utils import GOOGLE_BASE_URL, GeoInfo, get_geo_info, get_timezone, normalize_address
 
 
 class MistCloud(Enum):
@@ -12,6 +23,30 @@ class MistCloud(Enum):
     EU = "https://api.eu.mist.com/api/v1/{}"
 
 
+def create_session(pool_size: int = 10, rate_limiter: RateLimiter = None, max_rate_limit_retries: int = 3,
+                   metrics: Metrics = None) -> requests.Session:
+    """
+    Create a pooled keep-alive HTTP session
+
+    Failed requests are retried by the API object according to its retry policy, not by the adapter.
+
+    :param int pool_size: Number of connections kept alive per host
+    :param RateLimiter rate_limiter: Rate limiter shared by every request sent with the session
+    :param int max_rate_limit_retries: Number of times a request rejected with a 429 response is sent again
+    :param Metrics metrics: Metrics every request sent with the session is added to
+    :return requests.Session: A session with the adapter mounted for HTTP and HTTPS
+    """
+    if rate_limiter is not None:
+        adapter = RateLimitedAdapter(rate_limiter=rate_limiter, max_rate_limit_retries=max_rate_limit_retries,
+                                     metrics=metrics, pool_connections=pool_size, pool_maxsize=pool_size)
+    else:
+        adapter = MeasuredAdapter(metrics=metrics, pool_connections=pool_size, pool_maxsize=pool_size)
+    session = requests.Session()
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+
 class API(object):
 
     """Mist API Object"""
@@ -22,18 +57,83 @@ class API(object):
     cache_timeout: int = 10
     overwrite_devices: bool = False
     google_api_token: str = None
+    google_base_url: str = GOOGLE_BASE_URL
+    pool_size: int = 10
+    connect_timeout: float = 5
+    read_timeout: float = 30
+    max_retries: int = 3
+    page_limit: int = 1000
+    bulk_chunk_size: int = 100
+    csv_chunk_size: int = 1000
+    rate_limiter: RateLimiter = None
+    retry_policy: RetryPolicy = None
+    session: requests.Session = None
+    metrics: Metrics = None
+    geo_cache: GeoCache = None
+    snapshot: OrgSnapshot = None
+    tz_resolver: TimezoneResolver = None
+    geocode_concurrency: int = 10
+    recorder: CallRecorder = None
 
     def __init__(self, config: Config, cloud: MistCloud = MistCloud.STD):
         logger.debug("Initializing Mist API object...")
-        self.base_url = cloud.value
+        # A configured base URL, e.g. a local stand-in server, takes precedence over the cloud
+        base_url = config.mist.get('base_url')
+        if base_url:
+            self.base_url = base_url if '{}' in base_url else f"{base_url.rstrip('/')}/{{}}"
+        else:
+            self.base_url = cloud.value
         self.api_token = config.mist.api_token
         self.org_id = config.mist.org_id
         self.cache_timeout = config.mist.cache_timeout
         self.overwrite_devices = config.mist.overwrite_device
         self.google_api_token = config.google.api_token
-        if not self.verify():
+        self.google_base_url = (config.google.get('base_url') or self.google_base_url).rstrip('/')
+        self.pool_size = config.mist.get('pool_size', self.pool_size)
+        self.connect_timeout = config.mist.get('connect_timeout', self.connect_timeout)
+        self.read_timeout = config.mist.get('read_timeout', self.read_timeout)
+        self.max_retries = config.mist.get('max_retries', self.max_retries)
+        self.page_limit = config.mist.get('page_limit', self.page_limit)
+        self.bulk_chunk_size = config.mist.get('bulk_chunk_size', self.bulk_chunk_size)
+        self.csv_chunk_size = config.mist.get('csv_chunk_size', self.csv_chunk_size)
+        self.rate_limiter = RateLimiter(mist_hourly_limit=config.mist.get('rate_limit', 5000),
+                                        google_rate=config.google.get('rate_limit', 50))
+        self.retry_policy = RetryPolicy(max_retries=self.max_retries,
+                                        backoff_factor=config.mist.get('retry_backoff', 0.5),
+                                        max_backoff=config.mist.get('retry_max_backoff', 30),
+                                        budget=config.mist.get('retry_budget', 100))
+        self.metrics = Metrics()
+        self.session = create_session(pool_size=self.pool_size, rate_limiter=self.rate_limiter,
+                                      max_rate_limit_retries=self.max_retries, metrics=self.metrics)
+        self.geocode_concurrency = config.google.get('concurrency', self.geocode_concurrency)
+        cache_file = config.google.get('cache_file', "geocache.sqlite")
+        if cache_file:
+            self.geo_cache = GeoCache(filename=cache_file, ttl=config.google.get('cache_ttl', 2592000),
+                                      max_entries=config.google.get('cache_size', 100000))
+        timezone_boundaries = config.google.get('timezone_boundaries')
+        if timezone_boundaries:
+            try:
+                self.tz_resolver = TimezoneResolver(filename=timezone_boundaries)
+            except Exception as e:
+                logger.warning(f"Unable to load timezone boundaries, using the Google Time Zone API instead: {e}")
+        self.__geo_results = dict()
+        self.__geo_locks = dict()
+        self.__tz_results = dict()
+        self.__geo_lock = Lock()
+        snapshot_file = config.mist.get('snapshot_file', "mist_snapshot.sqlite")
+        if snapshot_file:
+            self.snapshot = OrgSnapshot(filename=snapshot_file, owner=sha256(self.api_token.encode()).hexdigest(),
+                                        ttls=dict(config.mist.get('snapshot_ttl') or {}),
+                                        revalidate=config.mist.get('snapshot_revalidate', True))
+        if self.snapshot is not None and self.snapshot.get(self.org_id, 'token') is not None:
+            # The token worked recently, check it again without delaying the start of the run
+            if self.snapshot.revalidate:
+                Thread(target=self.__revalidate_token, name="mist-revalidate-token", daemon=True).start()
+        elif not self.verify():
             logger.error("Unable to connect to the Mist API.")
             raise ValueError("Unable to connect to Mist API.")
+        elif self.snapshot is not None:
+            self.snapshot.set(self.org_id, 'token', True)
 
     def verify(self) -> bool:
         try:
@@ -45,37 +145,200 @@ class API(object):
         except Exception:
             raise
 
-    def http_get__(self, url: str = "self") -> requests.Response:
-        url = self.base_url.format(url)
+    def __revalidate_token(self):
         try:
-            res = requests.get(url=url, headers=self.headers)
-        except Exception:
-            raise
-        return res
+            self.verify()
+        except Exception as e:
+            logger.error(f"Unable to connect to the Mist API: {e}")
+            self.snapshot.invalidate('token')
+        else:
+            self.snapshot.set(self.org_id, 'token', True)
 
-    def http_post__(self, url: str, body: Union[Dict, List]) -> requests.Response:
-        url = self.base_url.format(url)
+    def __request(self, method: str, url: str, body: Union[Dict, List] = None,
+                  idempotent: bool = None) -> requests.Response:
+        if method == "GET" or self.snapshot is None:
+            return self.__send(method, url=url, body=body, idempotent=idempotent)
+        # Our own writes make the snapshot of the collection stale, including fetches running meanwhile
+        self.snapshot.invalidate_url(url)
         try:
-            res = requests.post(url=url, data=json.dumps(body), headers=self.headers)
-        except Exception:
-            raise
-        return res
+            return self.__send(method, url=url, body=body, idempotent=idempotent)
+        finally:
+            self.snapshot.invalidate_url(url)
 
-    def http_put__(self, url: str, body: Union[Dict, List]) -> requests.Response:
+    def __send(self, method: str, url: str, body: Union[Dict, List] = None,
+               idempotent: bool = None) -> requests.Response:
         url = self.base_url.format(url)
-        try:
-            res = requests.put(url=url, data=json.dumps(body), headers=self.headers)
-        except Exception:
-            raise
-        return res
+        data = json.dumps(body) if body is not None else None
+        attempt = 0
+        while True:
+            try:
+                res = self.session.request(method, url=url, data=data, headers=self.headers, timeout=self.timeout)
+            except requests.exceptions.RequestException as e:
+                if not self.retry_policy.should_retry(method, attempt, exception=e, idempotent=idempotent):
+                    raise
+                reason = str(e)
+            else:
+                if not self.retry_policy.should_retry(method, attempt, response=res, idempotent=idempotent):
+                    return res
+                reason = f"response {res.status_code}"
+            delay = self.retry_policy.backoff(attempt)
+            attempt += 1
+            self.metrics.retry(method, url)
+            logger.warning(f"Retrying {method} {url} in {delay:.1f}s after {reason} (retry {attempt})...")
+            sleep(delay)
+
+    def http_get__(self, url: str = "self") -> requests.Response:
+        return self.__request("GET", url=url)
+
+    def http_get_paginated__(self, url: str, limit: int = None) -> Iterator[Dict]:
+        """
+        Stream the items of a paginated collection, one page at a time
+
+        Follows the `limit` and `page` query parameters and stops once the items received reach the `X-Page-Total`
+        header, or on the first short page when the header is missing. The server may cap the page size below the
+        limit asked for, the `X-Page-Limit` header then gives the size of a full page.
+
+        :param str url: URL of the collection, relative to the API base URL
+        :param int limit: Number of items per page, defaults to the configured page limit
+        :return Iterator[Dict]: The items of the collection, yielded as their page arrives
+        """
+        limit = limit or self.page_limit
+        separator = '&' if '?' in url else '?'
+        page = 1
+        received = 0
+        while True:
+            res = self.http_get__(f"{url}{separator}limit={limit}&page={page}")
+            if res.status_code != 200:
+                raise ConnectionError(f"Could not retrieve page {page} of '{url}': {res.status_code} - {res.content}")
+            items = res.json()
+            yield from items
+            received += len(items)
+            total = res.headers.get('X-Page-Total')
+            if not items or (total is not None and received >= int(total)):
+                return
+            if total is None and len(items) != int(res.headers.get('X-Page-Limit') or limit):
+                # A short page is the last one, a longer page means the endpoint ignored the pagination parameters
+                return
+            page += 1
+
+    def http_post__(self, url: str, body: Union[Dict, List], idempotent: bool = False) -> requests.Response:
+        return self.__request("POST", url=url, body=body, idempotent=idempotent)
+
+    def http_put__(self, url: str, body: Union[Dict, List]) -> requests.Response:
+        return self.__request("PUT", url=url, body=body)
 
     def http_delete__(self, url: str) -> requests.Response:
-        url = self.base_url.format(url)
-        try:
-            res = requests.delete(url=url, headers=self.headers)
-        except Exception:
-            raise
-        return res
+        return self.__request("DELETE", url=url)
+
+    def geocode(self, address: str) -> GeoInfo:
+        """
+        Resolve the location and timezone of an address, each distinct address is only looked up once
+
+        :param str address: The address to resolve
+        :return GeoInfo: The location of the address
+        """
+        key = normalize_address(address)
+        with self.__geo_lock:
+            address_lock = self.__geo_locks.setdefault(key, Lock())
+        # Concurrent lookups of the same address wait for the first one instead of sending their own requests
+        with address_lock:
+            geo_info = self.__geo_results.get(key)
+            if geo_info is None and self.geo_cache is not None:
+                geo_info = self.geo_cache.get(address)
+            attempt = 0
+            while geo_info is None:
+                try:
+                    geo_info = get_geo_info(address=address, api_key=self.google_api_token, session=self.session,
+                                            timeout=self.timeout, tz_resolver=self.tz_resolver,
+                                            base_url=self.google_base_url)
+                except (requests.exceptions.RequestException, ConnectionError) as e:
+                    if not self.retry_policy.should_retry("GET", attempt, exception=e):
+                        logger.error(f"Unable to geocode address '{address}': {e}")
+                        return GeoInfo(lat=None, lng=None, country=None, address=address, timezone=None)
+                    delay = self.retry_policy.backoff(attempt)
+                    attempt += 1
+                    logger.warning(f"Retrying geocoding of '{address}' in {delay:.1f}s after {e} (retry {attempt})...")
+                    sleep(delay)
+                    continue
+                if self.geo_cache is not None and geo_info.lat is not None and geo_info.timezone:
+                    self.geo_cache.set(address, geo_info)
+            self.__geo_results[key] = geo_info
+        return geo_info
+
+    def timezone(self, lat: float, lng: float) -> Optional[str]:
+        """
+        Resolve the timezone of coordinates without geocoding, each distinct location is only looked up once
+
+        :param float lat: The latitude
+        :param float lng: The longitude
+        :return Optional[str]: The timezone ID, None if it could not be resolved
+        """
+        key = (round(lat, 6), round(lng, 6))
+        with self.__geo_lock:
+            location_lock = self.__geo_locks.setdefault(key, Lock())
+        with location_lock:
+            if key in self.__tz_results:
+                return self.__tz_results[key]
+            attempt = 0
+            while True:
+                try:
+                    timezone = get_timezone(lat=lat, lng=lng, api_key=self.google_api_token, session=self.session,
+                                            timeout=self.timeout, tz_resolver=self.tz_resolver,
+                                            base_url=self.google_base_url)
+                except (requests.exceptions.RequestException, ConnectionError) as e:
+                    if not self.retry_policy.should_retry("GET", attempt, exception=e):
+                        logger.error(f"Unable to resolve the timezone of {lat},{lng}: {e}")
+                        return None
+                    delay = self.retry_policy.backoff(attempt)
+                    attempt += 1
+                    logger.warning(f"Retrying timezone lookup of {lat},{lng} in {delay:.1f}s after {e} "
+                                   f"(retry {attempt})...")
+                    sleep(delay)
+                    continue
+                break
+            self.__tz_results[key] = timezone
+        return timezone
+
+    def cached_geocode(self, address: str) -> Optional[GeoInfo]:
+        """
+        Location of an address already resolved during this run or cached, without calling the Google APIs
+
+        :param str address: The address to look up
+        :return Optional[GeoInfo]: The location of the address, None if it was never resolved
+        """
+        geo_info = self.__geo_results.get(normalize_address(address))
+        if geo_info is None and self.geo_cache is not None:
+            geo_info = self.geo_cache.get(address)
+        return geo_info
+
+    def record_calls(self, recorder: CallRecorder = None) -> CallRecorder:
+        """
+        Count every request sent by the session from now on, Google API requests included
+
+        :param CallRecorder recorder: The recorder counting the requests, a new one if None
+        :return CallRecorder: The recorder counting the requests
+        """
+        if self.recorder is not None:
+            return self.recorder
+        self.recorder = recorder or CallRecorder()
+        # The same adapter is mounted for HTTP and HTTPS, it is wrapped once
+        transports = dict()
+        for prefix, adapter in list(self.session.adapters.items()):
+            if id(adapter) not in transports:
+                transports[id(adapter)] = RecordingTransport(adapter=adapter, recorder=self.recorder)
+            self.session.mount(prefix, transports[id(adapter)])
+        return self.recorder
+
+    def close(self):
+        self.session.close()
+        if self.geo_cache is not None:
+            self.geo_cache.close()
+        if self.snapshot is not None:
+            self.snapshot.close()
+
+    @property
+    def timeout(self) -> (float, float):
+        return self.connect_timeout, self.read_timeout
 
     @property
     def headers(self):
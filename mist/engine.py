@@ -0,0 +1,28 @@
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Iterable, List
+import mist.api
+from mist import logger
+
+
+def run_rows(api: mist.api.API, func: Callable, rows: Iterable, engine: str = "serial", concurrency: int = 1) -> List:
+    """
+    Process rows with the selected execution engine
+
+    :param mist.api.API api: Mist API object used by the rows
+    :param Callable func: The function processing a single row
+    :param Iterable rows: The rows to process
+    :param str engine: Execution engine, either 'serial' or 'threads'
+    :param int concurrency: Maximum number of rows in flight for the 'threads' engine
+    :return List: The results, in the same order as the rows
+    """
+    if engine != "serial" and api.pool_size < concurrency:
+        logger.warning(f"Connection pool size ({api.pool_size}) is lower than the concurrency ({concurrency}), "
+                       "set 'pool_size' in your config file to keep connections alive.")
+    if engine == "threads":
+        # Each row runs its whole chain on one worker, results are collected in row order on the calling thread
+        with ThreadPoolExecutor(max_workers=max(1, concurrency), thread_name_prefix="mist-worker") as executor:
+            return list(executor.map(func, rows))
+    elif engine == "serial":
+        return [func(row) for row in rows]
+    else:
+        raise ValueError(f"Unknown execution engine '{engine}'.")
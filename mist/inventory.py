@@ -0,0 +1,117 @@
+from threading import Lock
+from typing import AnyStr, Dict, Iterable, List, Optional
+from mist.model import Model
+
+
+def normalize_mac(mac: Optional[str]) -> Optional[str]:
+    """
+    Normalize a MAC address to the lowercase, separator-free format used by the Mist API
+
+    :param Optional[str] mac: The MAC address in any common notation
+    :return Optional[str]: The normalized MAC address
+    """
+    if not mac:
+        return None
+    return mac.lower().replace(':', '').replace('-', '').replace('.', '').strip()
+
+
+class InventoryDevice(Model):
+
+    """Mist Organization Inventory Entry"""
+
+    __slots__ = ('serial', 'mac', 'site_id', 'name', 'model', 'type', 'magic')
+
+    serial: str
+    mac: str
+    site_id: str
+    name: str
+    model: str
+    type: str
+    magic: str
+
+    def __init__(self, serial: str = None, mac: str = None, site_id: str = None, name: str = None, model: str = None,
+                 type: str = None, magic: str = None, **kwargs):
+        self.serial = serial
+        self.mac = mac
+        self.site_id = site_id
+        self.name = name
+        self.model = model
+        self.type = type
+        self.magic = magic
+        super(InventoryDevice, self).__init__()
+        if kwargs:
+            self._update_raw(kwargs)
+
+    def __repr__(self) -> AnyStr:
+        return f"<{self.__class__.__name__} object - Serial: {self.serial}, MAC: {self.mac}>"
+
+
+class Inventory(object):
+
+    """Mist Organization Inventory Index"""
+
+    devices: List[InventoryDevice]
+    by_serial: Dict[str, InventoryDevice]
+    by_mac: Dict[str, InventoryDevice]
+
+    def __init__(self, devices: Iterable[Dict] = None):
+        """
+        Initialize the inventory index.
+
+        :param Iterable[Dict] devices: Inventory entries as returned by the Mist API
+        """
+        self.devices = list()
+        self.by_serial = dict()
+        self.by_mac = dict()
+        self.__lock = Lock()
+        for device in devices or []:
+            self.add(device)
+
+    def add(self, device: Dict):
+        """
+        Add or update an inventory entry in the index
+
+        :param Dict device: Inventory entry as returned by the Mist API
+        """
+        serial = device.get('serial')
+        mac = normalize_mac(device.get('mac'))
+        with self.__lock:
+            existing = self.by_serial.get(serial) if serial else None
+            if existing is None and mac:
+                existing = self.by_mac.get(mac)
+            if existing is not None:
+                existing.set_attributes(**device)
+                device = existing
+                serial = device.serial
+                mac = normalize_mac(device.mac)
+            else:
+                device = InventoryDevice(**device)
+                self.devices.append(device)
+            if serial:
+                self.by_serial[serial] = device
+            if mac:
+                self.by_mac[mac] = device
+
+    def find(self, serial: str = None, mac: str = None) -> Optional[InventoryDevice]:
+        """
+        Find an inventory entry by serial number or MAC address
+
+        :param str serial: Serial number of the device
+        :param str mac: MAC address of the device
+        :return Optional[InventoryDevice]: The inventory entry, None if the device is not in the inventory
+        """
+        device = None
+        if serial:
+            device = self.by_serial.get(serial)
+        if device is None and mac:
+            device = self.by_mac.get(normalize_mac(mac))
+        return device
+
+    def __contains__(self, serial: str) -> bool:
+        return serial in self.by_serial
+
+    def __len__(self) -> int:
+        return len(self.devices)
+
+    def __str__(self) -> AnyStr:
+        return f"<{self.__class__.__name__} object -  Devices: {len(self.devices)}>"
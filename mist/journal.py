@@ -0,0 +1,91 @@
+import json
+from pathlib import Path
+from threading import Lock
+from time import time
+from typing import AnyStr, Dict, Optional, Tuple
+from mist import logger
+
+
+class Journal(object):
+
+    """Append-only JSON lines journal of the completed provisioning steps, used to resume interrupted runs"""
+
+    SITE = "site"
+    DEVICE = "device"
+
+    file: Path
+    org_id: str
+
+    def __init__(self, filename: AnyStr, org_id: str, resume: bool = False):
+        """
+        Open the journal.
+
+        :param AnyStr filename: The path of the journal file (either relative or absolute)
+        :param str org_id: ID of the organization provisioned, steps recorded for other organizations are ignored
+        :param bool resume: Keep the steps recorded by the previous runs, a new journal is started otherwise
+        """
+        self.file = Path(filename).expanduser().absolute()
+        self.org_id = org_id
+        self.__steps: Dict[Tuple[str, str], Dict[str, Dict]] = dict()
+        self.__lock = Lock()
+        if resume and self.file.exists():
+            ignored = 0
+            with self.file.open('r') as journal_stream:
+                for line in journal_stream:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        # The last line may be incomplete if the previous run was killed while writing it
+                        continue
+                    if entry.get('org_id') != org_id:
+                        ignored += 1
+                        continue
+                    self.__steps.setdefault((entry['kind'], entry['key']), dict())[entry['step']] = entry
+            if ignored:
+                logger.warning(f"Ignoring {ignored} steps of journal {self.file} recorded for another organization.")
+            logger.info(f"Resuming from journal {self.file} with {len(self.__steps)} started rows.")
+        self.__stream = self.file.open('a' if resume else 'w')
+        if resume and self.__stream.tell() > 0:
+            # Make sure the next entry does not continue an incomplete last line
+            with self.file.open('rb') as journal_stream:
+                journal_stream.seek(-1, 2)
+                if journal_stream.read(1) != b"\n":
+                    self.__stream.write("\n")
+
+    def record(self, kind: str, key: str, step: str, **ids):
+        """
+        Record a completed step of a CSV row
+
+        :param str kind: Kind of the row, either Journal.SITE or Journal.DEVICE
+        :param str key: Identity of the row, the site name or the device serial number
+        :param str step: Name of the completed step
+        :param dict ids: IDs resulting from the step
+        """
+        entry = dict(org_id=self.org_id, kind=kind, key=key, step=step, time=time(), **ids)
+        line = json.dumps(entry)
+        with self.__lock:
+            self.__steps.setdefault((kind, key), dict())[step] = entry
+            self.__stream.write(line + "\n")
+            self.__stream.flush()
+
+    def get(self, kind: str, key: str, step: str) -> Optional[Dict]:
+        """
+        Retrieve a completed step of a CSV row
+
+        :param str kind: Kind of the row, either Journal.SITE or Journal.DEVICE
+        :param str key: Identity of the row, the site name or the device serial number
+        :param str step: Name of the step
+        :return Optional[Dict]: The journal entry of the step, None if the step was not completed
+        """
+        with self.__lock:
+            return self.__steps.get((kind, key), dict()).get(step)
+
+    def close(self):
+        with self.__lock:
+            self.__stream.close()
+
+    def __len__(self) -> int:
+        return len(self.__steps)
+
+    def __str__(self):
+        return f"<{self.__class__.__name__} object - File: '{self.file}', Rows: {len(self.__steps)}>"
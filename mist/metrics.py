@@ -0,0 +1,298 @@
+import json
+import os
+from bisect import bisect_left
+from collections import Counter
+from pathlib import Path
+from threading import Lock
+from time import monotonic, perf_counter
+from typing import AnyStr, Dict, List, Optional, Tuple
+import requests
+from requests.adapters import HTTPAdapter
+from mist.transport import endpoint_template
+
+# Upper bounds of the latency histogram buckets in seconds, the default ones of the Prometheus clients
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.075, 0.1, 0.25, 0.5, 0.75, 1.0, 2.5, 5.0, 7.5, 10.0)
+
+
+class EndpointMetrics(object):
+
+    """Counters and latency histogram of the requests sent with one HTTP method to one endpoint template"""
+
+    method: str
+    endpoint: str
+    buckets: Tuple[float, ...]
+    requests: int = 0
+    errors: int = 0
+    retries: int = 0
+    bytes_sent: int = 0
+    bytes_received: int = 0
+    latency_sum: float = 0
+    latency_max: float = 0
+
+    def __init__(self, method: str, endpoint: str, buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        self.method = method
+        self.endpoint = endpoint
+        self.buckets = buckets
+        self.statuses: Counter = Counter()
+        # Number of requests per bucket, the last one counting the requests slower than the largest bound
+        self.bucket_counts: List[int] = [0] * (len(buckets) + 1)
+
+    def observe(self, duration: float, status: Optional[int] = None, bytes_sent: int = 0, bytes_received: int = 0):
+        """
+        Add a request
+
+        :param float duration: Number of seconds from sending the request to reading the whole response
+        :param Optional[int] status: HTTP status of the response, None if the request failed without a response
+        :param int bytes_sent: Size of the request body
+        :param int bytes_received: Size of the response body
+        """
+        self.requests += 1
+        if status is None:
+            self.errors += 1
+        else:
+            self.statuses[status] += 1
+        self.bytes_sent += bytes_sent
+        self.bytes_received += bytes_received
+        self.latency_sum += duration
+        self.latency_max = max(self.latency_max, duration)
+        self.bucket_counts[bisect_left(self.buckets, duration)] += 1
+
+    def quantile(self, q: float) -> Optional[float]:
+        """
+        Estimate a latency quantile from the histogram, interpolating linearly within the bucket like Prometheus does
+
+        :param float q: The quantile, between 0 and 1
+        :return Optional[float]: The estimated latency in seconds, None without any request
+        """
+        if not self.requests:
+            return None
+        rank = q * self.requests
+        cumulated = 0
+        for index, count in enumerate(self.bucket_counts):
+            if count and cumulated + count >= rank:
+                if index == len(self.buckets):
+                    return self.latency_max
+                lower = self.buckets[index - 1] if index else 0
+                upper = min(self.buckets[index], self.latency_max)
+                return lower + (upper - lower) * max(rank - cumulated, 0) / count
+            cumulated += count
+        return self.latency_max
+
+    def to_dict(self) -> Dict:
+        def milliseconds(seconds: Optional[float]) -> Optional[float]:
+            return round(seconds * 1000, 2) if seconds is not None else None
+
+        return {
+            "method": self.method,
+            "endpoint": self.endpoint,
+            "requests": self.requests,
+            "statuses": {str(status): count for status, count in sorted(self.statuses.items())},
+            "errors": self.errors,
+            "retries": self.retries,
+            "bytes_sent": self.bytes_sent,
+            "bytes_received": self.bytes_received,
+            "latency_ms": {
+                "mean": milliseconds(self.latency_sum / self.requests if self.requests else None),
+                "p50": milliseconds(self.quantile(0.5)),
+                "p90": milliseconds(self.quantile(0.9)),
+                "p99": milliseconds(self.quantile(0.99)),
+                "max": milliseconds(self.latency_max if self.requests else None),
+                "total": milliseconds(self.latency_sum)
+            }
+        }
+
+
+class Metrics(object):
+
+    """Thread-safe request metrics by HTTP method and endpoint template, Mist and Google API requests alike"""
+
+    buckets: Tuple[float, ...] = DEFAULT_BUCKETS
+
+    def __init__(self, buckets: Tuple[float, ...] = None):
+        """
+        Initialize empty metrics.
+
+        :param Tuple[float, ...] buckets: Upper bounds of the latency histogram buckets in seconds, in increasing order
+        """
+        if buckets is not None:
+            self.buckets = tuple(buckets)
+        self.__endpoints: Dict[Tuple[str, str], EndpointMetrics] = dict()
+        self.__lock = Lock()
+        self.__started = monotonic()
+
+    def __endpoint(self, method: str, url: str) -> EndpointMetrics:
+        # Only called with the lock held
+        key = (method.upper(), endpoint_template(url))
+        endpoint = self.__endpoints.get(key)
+        if endpoint is None:
+            endpoint = self.__endpoints[key] = EndpointMetrics(*key, buckets=self.buckets)
+        return endpoint
+
+    def observe(self, method: str, url: str, duration: float, status: Optional[int] = None, bytes_sent: int = 0,
+                bytes_received: int = 0):
+        """
+        Add a request sent over HTTP
+
+        :param str method: HTTP method of the request
+        :param str url: URL of the request
+        :param float duration: Number of seconds from sending the request to reading the whole response
+        :param Optional[int] status: HTTP status of the response, None if the request failed without a response
+        :param int bytes_sent: Size of the request body
+        :param int bytes_received: Size of the response body
+        """
+        with self.__lock:
+            self.__endpoint(method, url).observe(duration, status=status, bytes_sent=bytes_sent,
+                                                 bytes_received=bytes_received)
+
+    def retry(self, method: str, url: str):
+        """
+        Count a request about to be sent again, after an error or a 429 response
+
+        :param str method: HTTP method of the request
+        :param str url: URL of the request
+        """
+        with self.__lock:
+            self.__endpoint(method, url).retries += 1
+
+    @property
+    def elapsed(self) -> float:
+        """ Number of seconds since the metrics were created or reset """
+        return monotonic() - self.__started
+
+    @property
+    def endpoints(self) -> List[EndpointMetrics]:
+        """ Metrics of every endpoint requested, as a new list sorted by method and endpoint template """
+        with self.__lock:
+            return [self.__endpoints[key] for key in sorted(self.__endpoints)]
+
+    def reset(self):
+        with self.__lock:
+            self.__endpoints.clear()
+            self.__started = monotonic()
+
+    def summary(self) -> Dict:
+        """
+        Summary of the metrics, totals first and then one entry per method and endpoint template
+
+        :return Dict: The summary, JSON serializable
+        """
+        elapsed = self.elapsed
+        with self.__lock:
+            endpoints = [self.__endpoints[key].to_dict() for key in sorted(self.__endpoints)]
+        requests_sent = sum(endpoint['requests'] for endpoint in endpoints)
+        return {
+            "elapsed": round(elapsed, 3),
+            "requests": requests_sent,
+            "requests_per_second": round(requests_sent / elapsed, 2) if elapsed else None,
+            "mist_requests": sum(endpoint['requests'] for endpoint in endpoints
+                                 if not endpoint['endpoint'].startswith('google/')),
+            "google_requests": sum(endpoint['requests'] for endpoint in endpoints
+                                   if endpoint['endpoint'].startswith('google/')),
+            "errors": sum(endpoint['errors'] for endpoint in endpoints),
+            "retries": sum(endpoint['retries'] for endpoint in endpoints),
+            "bytes_sent": sum(endpoint['bytes_sent'] for endpoint in endpoints),
+            "bytes_received": sum(endpoint['bytes_received'] for endpoint in endpoints),
+            "endpoints": endpoints
+        }
+
+    def write_json(self, filename: AnyStr):
+        """
+        Write the summary of the metrics to a JSON file
+
+        :param AnyStr filename: Path of the JSON file
+        """
+        Path(filename).write_text(json.dumps(self.summary(), indent=2))
+
+    def prometheus(self, prefix: str = "mist_api") -> str:
+        """
+        Render the metrics in the Prometheus text exposition format
+
+        :param str prefix: Prefix of the metric names
+        :return str: The metrics
+        """
+        def labels(endpoint: EndpointMetrics, **extra) -> str:
+            values = dict(method=endpoint.method, endpoint=endpoint.endpoint, **extra)
+            escaped = (str(v).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for v in values.values())
+            return ','.join(f'{k}="{v}"' for k, v in zip(values, escaped))
+
+        endpoints = self.endpoints
+        lines = list()
+
+        def family(name: str, kind: str, description: str):
+            lines.append(f"# HELP {prefix}_{name} {description}")
+            lines.append(f"# TYPE {prefix}_{name} {kind}")
+
+        family("requests_total", "counter", "HTTP requests answered, by method, endpoint template and status code")
+        for endpoint in endpoints:
+            for status, count in sorted(endpoint.statuses.items()):
+                lines.append(f"{prefix}_requests_total{{{labels(endpoint, status=status)}}} {count}")
+        family("errors_total", "counter", "HTTP requests which failed without a response")
+        lines.extend(f"{prefix}_errors_total{{{labels(endpoint)}}} {endpoint.errors}" for endpoint in endpoints)
+        family("retries_total", "counter", "HTTP requests sent again after an error or a 429 response")
+        lines.extend(f"{prefix}_retries_total{{{labels(endpoint)}}} {endpoint.retries}" for endpoint in endpoints)
+        family("sent_bytes_total", "counter", "Bytes of request bodies sent")
+        lines.extend(f"{prefix}_sent_bytes_total{{{labels(endpoint)}}} {endpoint.bytes_sent}" for endpoint in endpoints)
+        family("received_bytes_total", "counter", "Bytes of response bodies received")
+        lines.extend(f"{prefix}_received_bytes_total{{{labels(endpoint)}}} {endpoint.bytes_received}"
+                     for endpoint in endpoints)
+        family("request_duration_seconds", "histogram", "Time from sending a request to reading the whole response")
+        for endpoint in endpoints:
+            cumulated = 0
+            for bound, count in zip(endpoint.buckets + (float('inf'),), endpoint.bucket_counts):
+                cumulated += count
+                le = "+Inf" if bound == float('inf') else repr(bound)
+                lines.append(f"{prefix}_request_duration_seconds_bucket{{{labels(endpoint, le=le)}}} {cumulated}")
+            lines.append(f"{prefix}_request_duration_seconds_sum{{{labels(endpoint)}}} {endpoint.latency_sum}")
+            lines.append(f"{prefix}_request_duration_seconds_count{{{labels(endpoint)}}} {endpoint.requests}")
+        return '\n'.join(lines) + '\n'
+
+    def write_prometheus(self, filename: AnyStr, prefix: str = "mist_api"):
+        """
+        Write the metrics to a Prometheus text file, e.g. for the textfile collector of the node exporter
+
+        The file is replaced atomically so a collector never reads it half written.
+
+        :param AnyStr filename: Path of the text file
+        :param str prefix: Prefix of the metric names
+        """
+        path = Path(filename)
+        temporary = path.with_name(f".{path.name}.{os.getpid()}")
+        temporary.write_text(self.prometheus(prefix=prefix))
+        os.replace(temporary, path)
+
+    def __str__(self):
+        return f"<{self.__class__.__name__} object - Endpoints: {len(self.endpoints)}>"
+
+
+def body_size(request: requests.PreparedRequest) -> int:
+    body = request.body
+    if isinstance(body, str):
+        return len(body.encode('utf-8'))
+    if isinstance(body, bytes):
+        return len(body)
+    return 0
+
+
+class MeasuredAdapter(HTTPAdapter):
+
+    """HTTP adapter adding the latency, status and size of every request it sends to request metrics"""
+
+    def __init__(self, metrics: Metrics = None, **kwargs):
+        self.metrics = metrics
+        super(MeasuredAdapter, self).__init__(**kwargs)
+
+    def send(self, request: requests.PreparedRequest, **kwargs) -> requests.Response:
+        if self.metrics is None:
+            return super(MeasuredAdapter, self).send(request, **kwargs)
+        start = perf_counter()
+        try:
+            response = super(MeasuredAdapter, self).send(request, **kwargs)
+            # The session reads the body right after anyway, reading it here counts the transfer in the latency
+            received = len(response.content) if not kwargs.get('stream') else \
+                int(response.headers.get('Content-Length') or 0)
+        except requests.exceptions.RequestException:
+            self.metrics.observe(request.method, request.url, perf_counter() - start, bytes_sent=body_size(request))
+            raise
+        self.metrics.observe(request.method, request.url, perf_counter() - start, status=response.status_code,
+                             bytes_sent=body_size(request), bytes_received=received)
+        return response
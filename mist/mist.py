@@ -31,8 +31,12 @@ class Mist(object):
             get_org_id = self.api.org_id
         else:
             get_org_id = org_id
-        res = self.api.http_get__(f"orgs/{get_org_id}")
-        org_data = res.json()
+        org_data = self.api.snapshot.get(get_org_id, 'org') if self.api.snapshot is not None else None
+        if org_data is None:
+            res = self.api.http_get__(f"orgs/{get_org_id}")
+            org_data = res.json()
+            if res.status_code == 200 and self.api.snapshot is not None:
+                self.api.snapshot.set(get_org_id, 'org', org_data)
         org_id = org_data.pop('id')
         name = org_data.pop('name')
         org = mist.org.Organization(name=name, api=self.api, org_id=org_id, **org_data)
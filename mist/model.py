@@ -0,0 +1,86 @@
+from typing import Any, Dict, FrozenSet, Tuple
+
+
+class Model(object):
+
+    """
+    Compact base of the Mist objects
+
+    Known fields are slots. Other API fields are kept in one optional raw record: a tuple of values along with a
+    tuple of field names shared by every object built from the same API payload layout.
+    """
+
+    __slots__ = ('_raw_keys', '_raw_values')
+
+    # Names of the public slots, and of the public slots plus the properties with a setter, computed for every subclass
+    fields: FrozenSet[str] = frozenset()
+    settable: FrozenSet[str] = frozenset()
+    __raw_keys: Dict[Tuple[str, ...], Tuple[str, ...]] = dict()
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        fields = set()
+        properties = set()
+        for klass in cls.__mro__:
+            fields.update(name for name in klass.__dict__.get('__slots__', ()) if not name.startswith('_'))
+            properties.update(name for name, value in klass.__dict__.items()
+                              if isinstance(value, property) and value.fset is not None)
+        cls.fields = frozenset(fields)
+        cls.settable = cls.fields | properties
+
+    def __init__(self):
+        self._raw_keys = None
+        self._raw_values = None
+
+    def set_attributes(self, **kwargs):
+        """
+        Assign API fields to the object, unknown fields are kept in the raw record
+
+        :param dict kwargs: The fields to assign
+        """
+        settable = self.settable
+        unknown = dict()
+        for k, v in kwargs.items():
+            if k in settable:
+                setattr(self, k, v)
+            else:
+                unknown[k] = v
+        if unknown:
+            self._update_raw(unknown)
+
+    def _update_raw(self, fields: Dict[str, Any]):
+        """
+        Merge API fields without a slot into the raw record
+
+        :param Dict[str, Any] fields: The fields to merge
+        """
+        if self._raw_keys is not None:
+            fields = dict(zip(self._raw_keys, self._raw_values), **fields)
+        keys = tuple(fields)
+        self._raw_keys = Model.__raw_keys.setdefault(keys, keys)
+        self._raw_values = tuple(fields.values())
+
+    @property
+    def raw(self) -> Dict[str, Any]:
+        """ API fields without a slot, as a new dict """
+        if self._raw_keys is None:
+            return dict()
+        return dict(zip(self._raw_keys, self._raw_values))
+
+    def to_dict(self) -> Dict[str, Any]:
+        """
+        Fields of the object which are set, known and raw ones
+
+        :return Dict[str, Any]: The fields, as a new dict
+        """
+        data = {name: getattr(self, name) for name in self.fields}
+        data.update(self.raw)
+        return {k: v for k, v in data.items() if v is not None}
+
+    def __getattr__(self, name: str) -> Any:
+        # Only called when the attribute is neither a slot set on the object nor a class attribute
+        if not name.startswith('_raw'):
+            keys = self._raw_keys
+            if keys is not None and name in keys:
+                return self._raw_values[keys.index(name)]
+        raise AttributeError(f"'{self.__class__.__name__}' object has no attribute '{name}'")
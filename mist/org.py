@@ -1,31 +1,47 @@
 # Standard library imports
-from typing import AnyStr, Dict, List, Union  # https://docs.python.org/3/library/typing.html?highlight=typing#module-typing
+from typing import AnyStr, Dict, Iterator, List, Optional, Tuple, Union  # https://docs.python.org/3/library/typing.html?highlight=typing#module-typing
 from pathlib import Path  # https://docs.python.org/3/library/pathlib.html?highlight=pathlib#module-pathlib
 from time import time  # https://docs.python.org/3/library/time.html?highlight=time#module-time
+from math import ceil  # https://docs.python.org/3/library/math.html#math.ceil
+from threading import Lock, Thread  # https://docs.python.org/3/library/threading.html#lock-objects
+from concurrent.futures import ThreadPoolExecutor  # https://docs.python.org/3/library/concurrent.futures.html
 # Module imports
 import mist.api
 import mist.site
 import mist.rftemplate
 import mist.sitegroup
 import mist.accesspoint
+import mist.inventory
 from mist import logger
-from src.utils import find_mist_object_id_by_name, parse_csv_file
+from mist.journal import Journal
+from mist.plan import Plan
+from mist.engine import run_rows
+from src.utils import chunked, iter_csv_file, normalize_address, parse_csv_file
 
 
 class Organization(object):
 
     """Mist Organization Object"""
 
+    COLLECTIONS = ('sites', 'sitegroups', 'rftemplates', 'inventory')
+
     api: mist.api.API
     org_id: str = None
     name: str
-    sites: [mist.site.Site] = None
+    journal: Journal = None
+    __sites: List[mist.site.Site] = None
+    __sites_by_name: Dict[str, mist.site.Site] = None
+    __sites_by_id: Dict[str, mist.site.Site] = None
     __last_sites_refresh: float = 0
-    sitegroups: list = None
+    __sitegroups: List[mist.sitegroup.Sitegroup] = None
+    __sitegroups_by_name: Dict[str, mist.sitegroup.Sitegroup] = None
+    __sitegroups_by_id: Dict[str, mist.sitegroup.Sitegroup] = None
     __last_sitegroups_refresh: float = 0
-    rftemplates: [mist.rftemplate.RFTemplate]
+    __rftemplates: List[mist.rftemplate.RFTemplate] = None
+    __rftemplates_by_name: Dict[str, mist.rftemplate.RFTemplate] = None
+    __rftemplates_by_id: Dict[str, mist.rftemplate.RFTemplate] = None
     __last_rftemplates_refresh: float = 0
-    inventory: list = [mist.accesspoint.AccessPoint]
+    __inventory: mist.inventory.Inventory = None
     __last_inventory_refresh: float = 0
 
     def __init__(self, name: str, api: mist.api.API, org_id: str = None, **kwargs):
@@ -43,21 +59,31 @@ class Organization(object):
         self.org_id = org_id
         for k, v in kwargs.items():
             setattr(self, k, v)
-        try:
-            self.get_sites()
-        except Exception as e:
-            logger.error(f"Exception getting organization sites: {e}")
-            raise e
-        try:
-            self.get_rftemplates()
-        except Exception as e:
-            logger.error(f"Exception getting organization RF templates: {e}")
-            raise e
-        try:
-            self.get_sitegroups()
-        except Exception as e:
-            logger.error(f"Exception getting organization site groups: {e}")
-            raise e
+        # Collections are loaded on first access, or together with preload()
+        self.__locks = {collection: Lock() for collection in self.COLLECTIONS}
+
+    def preload(self, *collections: str):
+        """
+        Load several collections of the organization concurrently
+
+        :param str collections: Names of the collections to load ('sites', 'sitegroups', 'rftemplates', 'inventory')
+        :returns None
+        """
+        loaders = {
+            'sites': self.get_sites,
+            'sitegroups': self.get_sitegroups,
+            'rftemplates': self.get_rftemplates,
+            'inventory': self.get_inventory
+        }
+        logger.debug(f"Loading organization {', '.join(collections)}...")
+        with ThreadPoolExecutor(max_workers=max(1, len(collections)), thread_name_prefix="mist-preload") as executor:
+            futures = {collection: executor.submit(loaders[collection]) for collection in collections}
+            for collection, future in futures.items():
+                try:
+                    future.result()
+                except Exception as e:
+                    logger.error(f"Exception getting organization {collection}: {e}")
+                    raise e
 
     def update(self):
         # TODO: write function to save changes
@@ -72,27 +98,128 @@ class Organization(object):
         self.__last_sites_refresh = 0
         _ = self.get_sites()
 
+    def iter_sites(self) -> Iterator[mist.site.Site]:
+        """
+        Stream the sites of the organization, building each page of sites as it arrives
+
+        :return Iterator[mist.site.Site]: The Mist Site objects
+        """
+        for site_data in self.__iter_collection('sites'):
+            yield self.__build_site(site_data)
+
+    def __build_site(self, site_data: Dict) -> mist.site.Site:
+        site_id = site_data.pop('id')
+        name = site_data.pop('name')
+        return mist.site.Site(name=name, api=self.api, site_id=site_id, **site_data)
+
     def get_sites(self) -> List[mist.site.Site]:
         """
         Retrieve a list of all the sites in the organization
 
         :returns List[mist.site.Site: A list of Mist Site objects.
         """
-        now = time()
-        if self.__last_sites_refresh > 0 and (now - self.__last_sites_refresh) < self.api.cache_timeout:
-            pass
-        else:
-            res = self.api.http_get__(f"orgs/{self.org_id}/sites")
-            self.__last_sites_refresh = time()
-            site_list = res.json()
-            sites = list()
-            for site_data in site_list:
-                site_id = site_data.pop('id')
-                name = site_data.pop('name')
-                site = mist.site.Site(name=name, api=self.api, site_id=site_id, **site_data)
-                sites.append(site)
-            self.sites = sites
-        return self.sites
+        with self.__locks['sites']:
+            now = time()
+            if self.__last_sites_refresh > 0 and (now - self.__last_sites_refresh) < self.api.cache_timeout:
+                pass
+            else:
+                cached = self.__from_snapshot('sites')
+                if cached is not None:
+                    sites = [self.__build_site(data) for data in cached]
+                else:
+                    sites = list(self.iter_sites())
+                self.__last_sites_refresh = time()
+                self.__store('sites', sites)
+        return self.__sites
+
+    def add_sites(self, sites: List[mist.site.Site]):
+        """
+        Add sites to the loaded site collection and its indexes without refetching the organization
+
+        :param List[mist.site.Site] sites: The sites to add
+        :returns None
+        """
+        with self.__locks['sites']:
+            # Sites not loaded yet will be fetched with the new ones on first access
+            if self.__sites is None:
+                return
+            for site in sites:
+                if site.site_id in self.__sites_by_id:
+                    continue
+                self.__sites.append(site)
+                self.__sites_by_id[site.site_id] = site
+                self.__sites_by_name.setdefault(site.name, site)
+
+    def verify_sites(self, sites: List[mist.site.Site], engine: str = "serial", concurrency: int = 1) -> int:
+        """
+        Check that sites exist in the Mist cloud with their name
+
+        The sites of the organization are listed when that takes fewer pages than there are sites to check, otherwise
+        only these sites are fetched.
+
+        :param List[mist.site.Site] sites: The sites to check
+        :param str engine: Execution engine used to check the sites ('serial' or 'threads')
+        :param int concurrency: Maximum number of sites checked at once
+        :return int: Number of sites found
+        """
+        if not sites:
+            return 0
+        if self.verify_pages() > len(sites):
+            results = run_rows(api=self.api, func=self.verify_site, rows=[site.site_id for site in sites],
+                               engine=engine, concurrency=concurrency)
+            return sum(1 for status in results if status)
+        # Listed straight from the API, the snapshot of the organization is not proof of anything
+        names = {site_data['id']: site_data.get('name')
+                 for site_data in self.api.http_get_paginated__(f"orgs/{self.org_id}/sites")}
+        verified = 0
+        for site in sites:
+            if site.site_id not in names:
+                logger.error(f"Could not verify site {site.name} ({site.site_id}) with Mist API, site not found.")
+            elif names[site.site_id] != site.name:
+                logger.error(f"Could not verify site {site.name} ({site.site_id}) with Mist API, site is named "
+                             f"'{names[site.site_id]}'.")
+            else:
+                verified += 1
+        return verified
+
+    def verify_pages(self, planned: int = 0) -> int:
+        """
+        Number of pages needed to list every site of the organization
+
+        :param int planned: Number of sites not created yet, counted along with the existing ones
+        :return int: The number of pages
+        """
+        return max(1, ceil((len(self.sites) + planned) / self.api.page_limit))
+
+    def verify_site(self, site_id: str) -> bool:
+        """
+        Check that a single site exists in the Mist cloud
+
+        :param str site_id: ID of the site
+        :return bool: Whether the site was found
+        """
+        res = self.api.http_get__(url=f"sites/{site_id}")
+        if res.status_code != 200 or res.json().get('id') != site_id:
+            logger.error(f"Could not verify site {site_id} with Mist API, status code: {res.status_code}")
+            return False
+        return True
+
+    def iter_sitegroups(self) -> Iterator[mist.sitegroup.Sitegroup]:
+        """
+        Stream the Sitegroups of the organization, building each page of Sitegroups as it arrives
+
+        :return Iterator[mist.sitegroup.Sitegroup]: The Mist Sitegroup objects
+        """
+        for sitegroup_data in self.__iter_collection('sitegroups'):
+            yield self.__build_sitegroup(sitegroup_data)
+
+    def __build_sitegroup(self, sitegroup_data: Dict) -> mist.sitegroup.Sitegroup:
+        sitegroup_id = sitegroup_data.pop('id')
+        name = sitegroup_data.pop('name')
+        org_id = sitegroup_data.pop('org_id')
+        site_ids = sitegroup_data.pop('site_ids', None)
+        return mist.sitegroup.Sitegroup(name=name, org_id=org_id, api=self.api, sitegroup_id=sitegroup_id, site_ids=site_ids,
+                                        **sitegroup_data)
 
     def get_sitegroups(self) -> List[mist.sitegroup.Sitegroup]:
         """
@@ -100,23 +227,33 @@ class Organization(object):
 
         :return List[mist.sitegroup.Sitegroup: A list of Sitegroups in the organization
         """
-        now = time()
-        if self.__last_sitegroups_refresh > 0 and (now - self.__last_sitegroups_refresh) < self.api.cache_timeout:
-            pass
-        else:
-            res = self.api.http_get__(f"orgs/{self.org_id}/sitegroups")
-            self.__last_sitegroups_refresh = time()
-            sitegroups_list = res.json()
-            sitegroups = list()
-            for sitegroup_data in sitegroups_list:
-                sitegroup_id = sitegroup_data.pop('id')
-                name = sitegroup_data.pop('name')
-                org_id = sitegroup_data.pop('org_id')
-                site_ids = sitegroup_data.pop('site_ids', None)
-                sitegroup = mist.sitegroup.Sitegroup(name=name, org_id=org_id, api=self.api, sitegroup_id=sitegroup_id, site_ids=site_ids)
-                sitegroups.append(sitegroup)
-            self.sitegroups = sitegroups
-        return self.sitegroups
+        with self.__locks['sitegroups']:
+            now = time()
+            if self.__last_sitegroups_refresh > 0 and (now - self.__last_sitegroups_refresh) < self.api.cache_timeout:
+                pass
+            else:
+                cached = self.__from_snapshot('sitegroups')
+                if cached is not None:
+                    sitegroups = [self.__build_sitegroup(data) for data in cached]
+                else:
+                    sitegroups = list(self.iter_sitegroups())
+                self.__last_sitegroups_refresh = time()
+                self.__store('sitegroups', sitegroups)
+        return self.__sitegroups
+
+    def iter_rftemplates(self) -> Iterator[mist.rftemplate.RFTemplate]:
+        """
+        Stream the RF Templates of the organization, building each page of RF Templates as it arrives
+
+        :return Iterator[mist.rftemplate.RFTemplate]: The Mist RF Template objects
+        """
+        for rftemplate_data in self.__iter_collection('rftemplates'):
+            yield self.__build_rftemplate(rftemplate_data)
+
+    def __build_rftemplate(self, rftemplate_data: Dict) -> mist.rftemplate.RFTemplate:
+        rftemplate_id = rftemplate_data.pop('id')
+        name = rftemplate_data.pop('name')
+        return mist.rftemplate.RFTemplate(name=name, api=self.api, rftemplate_id=rftemplate_id, **rftemplate_data)
 
     def get_rftemplates(self) -> List[mist.rftemplate.RFTemplate]:
         """
@@ -124,49 +261,364 @@ class Organization(object):
 
         :return List[mist.rftemplate.RFTemplate: A list of RF Templates in the organization
         """
-        now = time()
-        if self.__last_rftemplates_refresh > 0 and (now - self.__last_rftemplates_refresh) < self.api.cache_timeout:
-            pass
-        else:
-            res = self.api.http_get__(f"orgs/{self.org_id}/rftemplates")
-            self.__last_rftemplates_refresh = time()
-            rftemplate_list = res.json()
-            rftemplates = list()
-            for rftemplate_data in rftemplate_list:
-                rftemplate_id = rftemplate_data.pop('id')
-                name = rftemplate_data.pop('name')
-                rftemplate = mist.rftemplate.RFTemplate(name=name, api=self.api, rftemplate_id=rftemplate_id,
-                                                        **rftemplate_data)
-                rftemplates.append(rftemplate)
-            self.rftemplates = rftemplates
-        return self.rftemplates
+        with self.__locks['rftemplates']:
+            now = time()
+            if self.__last_rftemplates_refresh > 0 and (now - self.__last_rftemplates_refresh) < self.api.cache_timeout:
+                pass
+            else:
+                cached = self.__from_snapshot('rftemplates')
+                if cached is not None:
+                    rftemplates = [self.__build_rftemplate(data) for data in cached]
+                else:
+                    rftemplates = list(self.iter_rftemplates())
+                self.__last_rftemplates_refresh = time()
+                self.__store('rftemplates', rftemplates)
+        return self.__rftemplates
+
+    def __iter_collection(self, collection: str) -> Iterator[Dict]:
+        """
+        Stream a collection of the organization from the Mist API, and store it in the snapshot page by page
+
+        :param str collection: Name of the collection ('sites', 'sitegroups', 'rftemplates' or 'inventory')
+        :return Iterator[Dict]: The items of the collection as returned by the Mist API
+        """
+        snapshot = self.api.snapshot
+        if snapshot is None:
+            yield from self.api.http_get_paginated__(f"orgs/{self.org_id}/{collection}")
+            return
+        writer = snapshot.writer(self.org_id, collection, generation=snapshot.generation(collection),
+                                 page_size=self.api.page_limit)
+        try:
+            for data in self.api.http_get_paginated__(f"orgs/{self.org_id}/{collection}"):
+                writer.add(data)
+                yield data
+            writer.commit()
+        finally:
+            writer.close()
+
+    def __from_snapshot(self, collection: str) -> Optional[Iterator[Dict]]:
+        """
+        Stream a collection from the snapshot of a previous run, and refetch it in the background
+
+        :param str collection: Name of the collection ('sites', 'sitegroups', 'rftemplates' or 'inventory')
+        :return Optional[Iterator[Dict]]: The items of the collection, None if the snapshot is disabled or expired
+        """
+        snapshot = self.api.snapshot
+        if snapshot is None:
+            return None
+        items = snapshot.iter_items(self.org_id, collection)
+        if items is not None and snapshot.revalidate:
+            Thread(target=self.__revalidate, args=(collection,), name=f"mist-revalidate-{collection}",
+                   daemon=True).start()
+        return items
+
+    def __revalidate(self, collection: str):
+        """
+        Refetch a collection loaded from the snapshot and replace it, unless it was written to meanwhile
+
+        :param str collection: Name of the collection ('sites', 'sitegroups', 'rftemplates' or 'inventory')
+        :returns None
+        """
+        builders = {
+            'sites': self.__build_site,
+            'sitegroups': self.__build_sitegroup,
+            'rftemplates': self.__build_rftemplate
+        }
+        generation = self.api.snapshot.generation(collection)
+        try:
+            if collection == 'inventory':
+                objects = mist.inventory.Inventory(self.__iter_collection(collection))
+            else:
+                objects = [builders[collection](data) for data in self.__iter_collection(collection)]
+        except Exception as e:
+            logger.warning(f"Could not revalidate the organization {collection} snapshot: {e}")
+            return
+        with self.__locks[collection]:
+            if self.api.snapshot.generation(collection) != generation:
+                logger.debug(f"Discarding the revalidated organization {collection}, written to meanwhile.")
+                return
+            self.__store(collection, objects)
+        logger.debug(f"Revalidated the organization {collection} snapshot.")
+
+    def __store(self, collection: str, objects: Union[List, mist.inventory.Inventory]):
+        """
+        Replace a loaded collection and its indexes, the lock of the collection must be held
+
+        :param str collection: Name of the collection ('sites', 'sitegroups', 'rftemplates' or 'inventory')
+        :param Union[List, mist.inventory.Inventory] objects: The Mist objects of the collection
+        :returns None
+        """
+        if collection == 'sites':
+            self.__sites_by_name, self.__sites_by_id = self.__build_indexes(objects, 'site_id')
+            self.__sites = objects
+        elif collection == 'sitegroups':
+            self.__sitegroups_by_name, self.__sitegroups_by_id = self.__build_indexes(objects, 'sitegroup_id')
+            self.__sitegroups = objects
+        elif collection == 'rftemplates':
+            self.__rftemplates_by_name, self.__rftemplates_by_id = self.__build_indexes(objects, 'rftemplate_id')
+            self.__rftemplates = objects
+        elif collection == 'inventory':
+            self.__inventory = objects
+
+    @staticmethod
+    def __build_indexes(objects: List, id_attr: str) -> (Dict, Dict):
+        """
+        Index Mist objects by name and by ID
+
+        :param List objects: The Mist objects to index
+        :param str id_attr: Name of the attribute holding the object ID
+        :return (Dict, Dict): The objects indexed by name and by ID, the first object wins on duplicate names
+        """
+        by_name = dict()
+        by_id = dict()
+        for obj in objects:
+            by_name.setdefault(obj.name, obj)
+            by_id[getattr(obj, id_attr)] = obj
+        return by_name, by_id
+
+    @staticmethod
+    def __find(by_name: Dict, by_id: Dict, name: str = None, object_id: str = None) -> Optional[object]:
+        """
+        Look up a Mist object in its indexes, by ID if given, else by name
+
+        :param Dict by_name: The objects indexed by name
+        :param Dict by_id: The objects indexed by ID
+        :param str name: Name of the object
+        :param str object_id: ID of the object
+        :return Optional[object]: The matching object, None if there is no match
+        """
+        if object_id:
+            return by_id.get(object_id)
+        if name:
+            match = by_name.get(name.strip())
+            if match is None:
+                logger.error(f"Could not match object named '{name.strip()}' with anything in the organization.")
+            return match
+        return None
+
+    def find_site(self, name: str = None, site_id: str = None) -> Optional[mist.site.Site]:
+        """
+        Find a site by name or by ID
+
+        :param str name: Name of the site
+        :param str site_id: ID of the site
+        :return Optional[mist.site.Site]: The matching site, None if there is no match
+        """
+        if self.__sites is None:
+            self.get_sites()
+        return self.__find(self.__sites_by_name, self.__sites_by_id, name=name, object_id=site_id)
+
+    def find_sitegroup(self, name: str = None, sitegroup_id: str = None) -> Optional[mist.sitegroup.Sitegroup]:
+        """
+        Find a site group by name or by ID
+
+        :param str name: Name of the site group
+        :param str sitegroup_id: ID of the site group
+        :return Optional[mist.sitegroup.Sitegroup]: The matching site group, None if there is no match
+        """
+        if self.__sitegroups is None:
+            self.get_sitegroups()
+        return self.__find(self.__sitegroups_by_name, self.__sitegroups_by_id, name=name, object_id=sitegroup_id)
+
+    def find_rftemplate(self, name: str = None, rftemplate_id: str = None) -> Optional[mist.rftemplate.RFTemplate]:
+        """
+        Find an RF template by name or by ID
+
+        :param str name: Name of the RF template
+        :param str rftemplate_id: ID of the RF template
+        :return Optional[mist.rftemplate.RFTemplate]: The matching RF template, None if there is no match
+        """
+        if self.__rftemplates is None:
+            self.get_rftemplates()
+        return self.__find(self.__rftemplates_by_name, self.__rftemplates_by_id, name=name, object_id=rftemplate_id)
+
+    def refresh_inventory(self):
+        """
+        Force a refresh of the organization inventory
+
+        :returns None
+        """
+        self.__last_inventory_refresh = 0
+        _ = self.get_inventory()
+
+    def iter_inventory(self) -> Iterator[Dict]:
+        """
+        Stream the entries of the organization inventory, one page at a time
+
+        :return Iterator[Dict]: The inventory entries as returned by the Mist API
+        """
+        return self.__iter_collection('inventory')
+
+    def get_inventory(self) -> mist.inventory.Inventory:
+        """
+        Retrieve the whole organization inventory, one page at a time, and index it by serial and MAC address
+
+        :return mist.inventory.Inventory: The indexed organization inventory
+        """
+        with self.__locks['inventory']:
+            now = time()
+            if self.__last_inventory_refresh > 0 and (now - self.__last_inventory_refresh) < self.api.cache_timeout:
+                pass
+            else:
+                cached = self.__from_snapshot('inventory')
+                inventory = mist.inventory.Inventory(cached if cached is not None else self.iter_inventory())
+                self.__last_inventory_refresh = time()
+                logger.debug(f"Loaded {len(inventory)} devices from the organization inventory.")
+                self.__store('inventory', inventory)
+        return self.__inventory
 
     # CSV based functions
 
-    def create_sites(self, csv_file: Union[AnyStr, Path]) -> (List[mist.site.Site], int):
+    def create_sites(self, csv_file: Union[AnyStr, Path], engine: str = "serial",
+                     concurrency: int = 1, upsert: bool = False) -> (List[mist.site.Site], int):
         """
-        Create new sites from a CSV file
+        Create new sites from a CSV file, streamed and processed one chunk of rows at a time
 
         :param Union[AnyStr, Path] csv_file: A string or pathlib.Path reference to the CSV file location
-        :return List[mist.site.Site]: A list of created Mist sites
+        :param str engine: Execution engine used to create the sites ('serial' or 'threads')
+        :param int concurrency: Maximum number of sites created at once
+        :param bool upsert: Update the existing sites with the same name instead of creating new ones
+        :return List[mist.site.Site]: A list of created and updated Mist sites
         """
         logger.debug("Starting site processing and building...")
-        new_sites = self.build_sites(csv_file=csv_file)
-        logger.debug(f"Starting site creation process for {len(new_sites)} sites...")
-        created = 0
-        for idx, new_site in enumerate(new_sites, start=1):
-            logger.debug(f"Creating site #{idx}: {new_site.name}")
-            status, response = new_site.create()
-            if not status:
-                logger.error(f"Failed to create site #{idx}: {new_site.name}")
-            else:
-                created += 1
-                logger.info(f"Created site #{idx}: {new_site.name}")
-        # Refresh sites from the Mist cloud before returning
+        self.preload('sites', 'sitegroups', 'rftemplates')
+        created_sites = list()
+        updated_sites = list()
+        rows = enumerate(iter_csv_file(csv_file=csv_file), start=1)
+        for chunk in chunked(rows, self.api.csv_chunk_size):
+            new_sites = list()
+            existing_sites = list()
+            for idx, site in chunk:
+                if self.__site_created(idx, site):
+                    continue
+                existing = self.__sites_by_name.get(site['name']) if upsert else None
+                if existing is not None:
+                    self.__reuse_location(site, existing)
+                new_site = self.build_site(idx, site)
+                if new_site is None:
+                    continue
+                if existing is not None:
+                    existing_sites.append((idx, new_site, existing))
+                else:
+                    new_sites.append((idx, new_site))
+            self.geocode_sites(sites=[new_site for _, new_site in new_sites] +
+                               [new_site for _, new_site, _ in existing_sites])
+            if new_sites:
+                logger.debug(f"Starting site creation process for {len(new_sites)} sites from site #{new_sites[0][0]}...")
+                results = run_rows(api=self.api, func=self.create_site, rows=new_sites, engine=engine,
+                                   concurrency=concurrency)
+                # Add the created sites to the cache instead of refetching every site
+                chunk_sites = [site for site in results if site is not None]
+                self.add_sites(chunk_sites)
+                created_sites.extend(chunk_sites)
+            # Only send the fields that changed, and nothing at all for sites already up to date
+            changed_sites = list()
+            for idx, new_site, existing in existing_sites:
+                changes = new_site.diff(existing)
+                if changes:
+                    changed_sites.append((idx, new_site, existing, changes))
+                else:
+                    logger.info(f"Site #{idx}: {new_site.name} is already up to date, skipping.")
+            if changed_sites:
+                results = run_rows(api=self.api, func=self.update_site, rows=changed_sites, engine=engine,
+                                   concurrency=concurrency)
+                updated_sites.extend(site for site in results if site is not None)
+        # Check only the created sites
         logger.debug("Verifying sites with Mist API...")
-        self.refresh_sites()
+        verified = self.verify_sites(created_sites, engine=engine, concurrency=concurrency)
+        if verified < len(created_sites):
+            logger.error(f"Only {verified} of {len(created_sites)} created sites could be verified with Mist API.")
         logger.debug("Completed site creation process.")
-        return new_sites, created
+        return created_sites + updated_sites, len(created_sites) + len(updated_sites)
+
+    def update_site(self, row: (int, mist.site.Site, mist.site.Site, Dict)) -> Optional[mist.site.Site]:
+        """
+        Update a single existing site from a CSV row
+
+        :param (int, mist.site.Site, mist.site.Site, Dict) row: The CSV row number, the site built from it, the
+            existing site and the fields to change
+        :return Optional[mist.site.Site]: The updated existing site, None if it was not updated
+        """
+        idx, new_site, existing, changes = row
+        logger.debug(f"Updating site #{idx}: {new_site.name} ({', '.join(changes)})")
+        new_site.site_id = existing.site_id
+        status, response = new_site.update(changes)
+        if not status:
+            logger.error(f"Failed to update site #{idx}: {new_site.name}")
+            return None
+        logger.info(f"Updated site #{idx}: {new_site.name}")
+        site_data = dict(response)
+        site_data.pop('id', None)
+        existing.set_attributes(**site_data)
+        if self.journal is not None:
+            self.journal.record(Journal.SITE, new_site.name, "updated", site_id=existing.site_id,
+                                fields=list(changes))
+        return existing
+
+    def __reuse_location(self, site: Dict, existing: mist.site.Site):
+        """
+        Use the location of an existing site for its CSV row when the address did not change, to skip geocoding
+
+        :param Dict site: The CSV row of the site
+        :param mist.site.Site existing: The existing site with the same name
+        :returns None
+        """
+        if site.get('lat') is not None or site.get('lng') is not None or not site.get('address'):
+            return
+        if existing.lat is None or existing.lng is None or not existing.timezone or not existing.address:
+            return
+        if normalize_address(site['address']) != normalize_address(existing.address):
+            # The existing address may be the one formatted by the Google Geocoding API
+            geo_info = self.api.cached_geocode(site['address'])
+            if geo_info is None or geo_info.address != existing.address:
+                return
+        site['address'] = existing.address
+        site['lat'] = existing.lat
+        site['lng'] = existing.lng
+        site['country_code'] = existing.country_code
+        if not site.get('timezone'):
+            site['timezone'] = existing.timezone
+
+    def create_site(self, row: (int, mist.site.Site)) -> Optional[mist.site.Site]:
+        """
+        Create a single site built from a CSV row
+
+        :param (int, mist.site.Site) row: The CSV row number and the site built from it
+        :return Optional[mist.site.Site]: The site as returned by the Mist API, None if it was not created
+        """
+        idx, new_site = row
+        logger.debug(f"Creating site #{idx}: {new_site.name}")
+        # Sites sharing the name are told apart from the new one if its creation has to be checked
+        existing_ids = [site.site_id for site in self.sites if site.name == new_site.name] \
+            if new_site.name in self.__sites_by_name else []
+        try:
+            status, response = new_site.create(existing_ids=existing_ids)
+        except Exception as e:
+            logger.error(f"Exception occurred creating site #{idx}: {new_site.name}: {e}")
+            return None
+        if not status:
+            logger.error(f"Failed to create site #{idx}: {new_site.name}")
+            return None
+        logger.info(f"Created site #{idx}: {new_site.name}")
+        if self.journal is not None:
+            self.journal.record(Journal.SITE, new_site.name, "created", site_id=response['id'])
+        return self.__build_site(dict(response))
+
+    def __site_created(self, idx: int, site: Dict) -> bool:
+        """
+        Check whether a site was created by a previous run recorded in the journal
+
+        :param int idx: The CSV row number
+        :param Dict site: The CSV row of the site
+        :return bool: Whether the site was already created
+        """
+        if self.journal is None:
+            return False
+        entry = self.journal.get(Journal.SITE, site['name'], "created")
+        if entry is None:
+            return False
+        logger.info(f"Site #{idx}: {site['name']} was already created with ID {entry['site_id']}, skipping.")
+        return True
 
     def build_sites(self, csv_file: Union[AnyStr, Path]) -> List[mist.site.Site]:
         """
@@ -177,86 +629,496 @@ class Organization(object):
         """
         logger.debug("Parsing CSV file...")
         sites_csv_data = parse_csv_file(csv_file=csv_file)
-        new_sites = list()
         logger.debug(f"Processing {len(sites_csv_data)} sites...")
-        for idx, site in enumerate(sites_csv_data, start=1):
-            logger.debug(f"Processing site #{idx}: {site['name']}")
-            if site['sitegroups']:
-                sitegroups = site.pop('sitegroups').split(',')
-                sitegroup_ids = list()
-                for sitegroup in sitegroups:
-                    sg_id = find_mist_object_id_by_name(sitegroup, self.sitegroups)
-                    if sg_id:
-                        sitegroup_ids.append(sg_id)
-                    else:
-                        site['sitegroup_ids'] = sitegroup_ids
-            else:
-                del site['sitegroups']
-            if site['rftemplate']:
-                site['rftemplate_id'] = find_mist_object_id_by_name(site['rftemplate'], self.rftemplates)
+        sites = (self.build_site(idx, site) for idx, site in enumerate(sites_csv_data, start=1))
+        return [site for site in sites if site is not None]
+
+    def build_site(self, idx: int, site: Dict) -> Optional[mist.site.Site]:
+        """
+        Construct a new site object from a CSV row
+
+        :param int idx: The CSV row number
+        :param Dict site: The CSV row of the site
+        :return Optional[mist.site.Site]: The Mist site, None if the row is invalid
+        """
+        logger.debug(f"Processing site #{idx}: {site['name']}")
+        if site['sitegroups']:
+            sitegroup_ids = list()
+            missing = list()
+            for sitegroup_name in site.pop('sitegroups').split(','):
+                sitegroup = self.find_sitegroup(name=sitegroup_name)
+                if sitegroup:
+                    sitegroup_ids.append(sitegroup.sitegroup_id)
+                else:
+                    missing.append(sitegroup_name)
+            if missing:
+                # Like an unknown RF template, the site groups are left untouched rather than partially replaced
+                logger.warning(f"Site group(s) {', '.join(missing)} not found, the site groups of site "
+                               f"{site['name']} are left unchanged.")
             else:
-                del site['rftemplate']
-            site['api'] = self.api
-            site['org_id'] = self.org_id
-            logger.debug(f"Building site #{idx}: {site['name']}")
-            new_site = mist.site.Site(**site)
-            new_sites.append(new_site)
-        return new_sites
-
-    def assign_devices_from_csv(self, csv_file: Union[AnyStr, Path]) -> (List[mist.accesspoint.AccessPoint], int):
-        aps_csv_data = parse_csv_file(csv_file=csv_file)
+                site['sitegroup_ids'] = sitegroup_ids
+        else:
+            del site['sitegroups']
+        if site['rftemplate']:
+            rftemplate = self.find_rftemplate(name=site['rftemplate'])
+            site['rftemplate_id'] = rftemplate.rftemplate_id if rftemplate else None
+        else:
+            del site['rftemplate']
+        # Coordinates supplied in the CSV file are used as is and skip geocoding
+        for coordinate in ('lat', 'lng'):
+            if site.get(coordinate) is not None:
+                try:
+                    site[coordinate] = float(site[coordinate])
+                except ValueError:
+                    logger.error(f"Invalid {coordinate} '{site[coordinate]}' for site #{idx}: {site['name']}, "
+                                 f"skipping.")
+                    return None
+        site['api'] = self.api
+        site['org_id'] = self.org_id
+        logger.debug(f"Building site #{idx}: {site['name']}")
+        return mist.site.Site(**site)
+
+    def geocode_sites(self, sites: List[mist.site.Site]):
+        """
+        Resolve the pending locations of sites, looking up every distinct address once and in parallel
+
+        :param List[mist.site.Site] sites: The sites to geocode, sites with a known location are skipped
+        :returns None
+        """
+        addresses = dict()
+        locations = set()
+        for site in sites:
+            if site.geocoding_pending:
+                addresses.setdefault(normalize_address(site.address), site.address)
+            elif site.location_pending:
+                # The coordinates of the CSV file are kept, only their timezone is looked up
+                locations.add((site.lat, site.lng))
+        if not addresses and not locations:
+            return
+        logger.debug(f"Resolving {len(addresses)} distinct addresses and {len(locations)} timezones...")
+        run_rows(api=self.api, func=self.api.geocode, rows=addresses.values(), engine="threads",
+                 concurrency=self.api.geocode_concurrency)
+        run_rows(api=self.api, func=lambda location: self.api.timezone(*location), rows=locations, engine="threads",
+                 concurrency=self.api.geocode_concurrency)
+        for site in sites:
+            site.resolve_location()
+
+    def assign_devices_from_csv(self, csv_file: Union[AnyStr, Path], engine: str = "serial",
+                                concurrency: int = 1) -> (List[mist.accesspoint.AccessPoint], int):
+        """
+        Claim and assign devices to sites from a CSV file, streamed and processed one chunk of rows at a time
+
+        :param Union[AnyStr, Path] csv_file: A string or pathlib.Path reference to the CSV file location
+        :param str engine: Execution engine used to provision the devices ('serial' or 'threads')
+        :param int concurrency: Maximum number of devices provisioned at once
+        :return (List[mist.accesspoint.AccessPoint], int): A list of provisioned devices and their count
+        """
+        # Fetch the whole inventory once instead of looking up every device on its own
+        self.preload('sites', 'inventory')
         aps = list()
-        assigned = 0
-        for ap in aps_csv_data:
-            try:
-                new_ap = mist.accesspoint.AccessPoint(hostname=ap['hostname'], serial=ap['serial'], org_id=self.org_id, api=self.api, mac=ap['mac'])
-            except Exception as e:
-                logger.error(f"Exception occured creating new object: {e}")
+        for aps_csv_data in chunked(iter_csv_file(csv_file=csv_file), self.api.csv_chunk_size):
+            aps.extend(self.assign_devices_from_rows(aps_csv_data, engine=engine, concurrency=concurrency))
+        return aps, len(aps)
+
+    def assign_devices_from_rows(self, aps_csv_data: List[Dict], engine: str = "serial",
+                                 concurrency: int = 1) -> List[mist.accesspoint.AccessPoint]:
+        """
+        Claim and assign devices to sites from CSV rows
+
+        :param List[Dict] aps_csv_data: The CSV rows of the devices
+        :param str engine: Execution engine used to provision the devices ('serial' or 'threads')
+        :param int concurrency: Maximum number of devices provisioned at once
+        :return List[mist.accesspoint.AccessPoint]: A list of provisioned devices
+        """
+        devices = self.resolve_devices(aps_csv_data)
+        # Claim every device missing from the inventory in bulk before assigning anything
+        unclaimed = [new_ap for _, new_ap, claim, _ in devices if claim]
+        if unclaimed:
+            claimed = self.claim_devices(aps=unclaimed, engine=engine, concurrency=concurrency)
+            failed = set(id(new_ap) for new_ap in unclaimed) - set(id(new_ap) for new_ap in claimed)
+            devices = [device for device in devices if id(device[1]) not in failed]
+        # Assign the devices with one request per site (or chunk of a site), skipping those already in place
+        sites = dict()
+        in_place = set()
+        for ap, new_ap, _, site_id in devices:
+            if new_ap.site_id == site_id:
+                logger.info(f"Device {new_ap.hostname} is already assigned to site {ap['site_name']}, skipping.")
+                in_place.add(id(new_ap))
                 continue
-            in_inventory = new_ap.update_from_org_inventory()
-            if not in_inventory:
-                if ap['claim_code']:
-                    claimed = new_ap.claim_to_org(claim_code=ap['claim_code'])
-                    if not claimed:
-                        logger.error(f"Could not claim {new_ap.hostname} - {new_ap.serial} to org, skipping.")
-                        continue
-                    else:
-                        logger.info(f"Claimed {new_ap.hostname} - {new_ap.serial} to org inventory.")
-                else:
-                    logger.error(f"No claim code provided for {new_ap.hostname} - {new_ap.serial}, skipping.")
-                    continue
+            logger.info(f"Attmepting to assign {new_ap.hostname} to site: {ap['site_name']}")
+            sites.setdefault(site_id, list()).append(new_ap)
+        chunk_size = self.api.bulk_chunk_size
+        chunks = [(site_id, site_aps[i:i + chunk_size]) for site_id, site_aps in sites.items()
+                  for i in range(0, len(site_aps), chunk_size)]
+        results = run_rows(api=self.api, func=self.assign_chunk, rows=chunks, engine=engine, concurrency=concurrency)
+        assigned = set(id(new_ap) for site_aps in results for new_ap in site_aps) | in_place
+        # Devices keep the order of their CSV rows, whether they were assigned now or already in place
+        devices = [(ap, new_ap) for ap, new_ap, _, _ in devices if id(new_ap) in assigned]
+        results = run_rows(api=self.api, func=self.rename_device, rows=devices, engine=engine,
+                           concurrency=concurrency)
+        return [new_ap for new_ap in results if new_ap]
+
+    def resolve_devices(self, aps_csv_data: List[Dict], planned_sites: Dict[str, str] = None) \
+            -> List[Tuple[Dict, mist.accesspoint.AccessPoint, bool, str]]:
+        """
+        Build devices from CSV rows and resolve their site, using only the loaded organization state
+
+        :param List[Dict] aps_csv_data: The CSV rows of the devices
+        :param Dict[str, str] planned_sites: IDs of the sites not created yet, by name
+        :return List[Tuple[Dict, mist.accesspoint.AccessPoint, bool, str]]: The CSV row, the device, whether it
+            still needs to be claimed and the ID of its site, for every device that can be provisioned
+        """
+        devices = list()
+        for ap in aps_csv_data:
+            if planned_sites and ap['site_name'] in planned_sites:
+                site_id = planned_sites[ap['site_name']]
             else:
-                if self.api.overwrite_devices:
-                    logger.info(f"Device {new_ap.name} - {new_ap.serial} already in inventory, overwriting device configuration.")
-                    logger.warning("Set the 'overwrite_devices' option to 'false' in your config file to prevent reassigning the device.")
-                    pass
-                else:
-                    logger.error(f"Device {new_ap.name} - {new_ap.serial} already in inventory, skipping device configuration.")
-                    logger.warning("Set the 'overwrite_devices' option to 'true' in your config file to reassign the device.")
-                    continue
-            try:
-                logger.info(f"Attmepting to assign to site: {ap['site_name']}")
-                site_id = find_mist_object_id_by_name(ap['site_name'], self.sites)
-                if not site_id:
+                site = self.find_site(name=ap['site_name'])
+                if not site:
                     logger.error(f"Could not find site: {ap['site_name']}")
-                    logger.error(f"Skipping device configuration...")
+                    logger.error(f"Skipping device configuration for {ap['hostname']}...")
                     continue
-                else:
-                    new_ap.assign_to_site(site_id=site_id)
-            except Exception as e:
-                logger.error(f"Exception occurred assigning site: {e}")
+                site_id = site.site_id
+            new_ap, claim = self.load_device(ap)
+            if new_ap is None:
                 continue
-            if ap['hostname'] != new_ap.name:
-                new_ap.rename(ap['hostname'])
+            devices.append((ap, new_ap, claim, site_id))
+        return devices
+
+    def load_device(self, ap: Dict) -> (Optional[mist.accesspoint.AccessPoint], bool):
+        """
+        Build a device from a CSV row and look it up in the organization inventory
+
+        :param Dict ap: The CSV row of the device
+        :return (Optional[mist.accesspoint.AccessPoint], bool): The device, None if it is skipped, and whether it
+            still needs to be claimed
+        """
+        try:
+            new_ap = mist.accesspoint.AccessPoint(hostname=ap['hostname'], serial=ap['serial'], org_id=self.org_id, api=self.api, mac=ap['mac'])
+        except Exception as e:
+            logger.error(f"Exception occured creating new object: {e}")
+            return None, False
+        in_inventory = new_ap.update_from_org_inventory(inventory=self.inventory)
+        if not in_inventory:
+            if ap['claim_code']:
+                new_ap.claim_code = ap['claim_code']
+                return new_ap, True
             else:
-                logger.debug(f"Device name already up to date for {new_ap.hostname}")
-            logger.debug(f"Finished privisioning device: {new_ap.hostname}")
-            aps.append(new_ap)
-            assigned += 1
-        return aps, assigned
+                logger.error(f"No claim code provided for {new_ap.hostname} - {new_ap.serial}, skipping.")
+                return None, False
+        else:
+            if self.__device_step(new_ap, "claimed") is not None:
+                logger.info(f"Device {new_ap.hostname} - {new_ap.serial} was claimed by a previous run, resuming.")
+                return new_ap, False
+            elif self.api.overwrite_devices:
+                logger.info(f"Device {new_ap.name} - {new_ap.serial} already in inventory, overwriting device configuration.")
+                logger.warning("Set the 'overwrite_devices' option to 'false' in your config file to prevent reassigning the device.")
+                return new_ap, False
+            else:
+                logger.error(f"Device {new_ap.name} - {new_ap.serial} already in inventory, skipping device configuration.")
+                logger.warning("Set the 'overwrite_devices' option to 'true' in your config file to reassign the device.")
+                return None, False
+
+    def claim_devices(self, aps: List[mist.accesspoint.AccessPoint], engine: str = "serial",
+                      concurrency: int = 1) -> List[mist.accesspoint.AccessPoint]:
+        """
+        Claim devices to the organization with one inventory POST per chunk of claim codes
+
+        :param List[mist.accesspoint.AccessPoint] aps: Devices with a `claim_code` attribute
+        :param str engine: Execution engine used to send the chunks ('serial' or 'threads')
+        :param int concurrency: Maximum number of chunks sent at once
+        :return List[mist.accesspoint.AccessPoint]: The devices that were claimed
+        """
+        chunk_size = self.api.bulk_chunk_size
+        chunks = [aps[i:i + chunk_size] for i in range(0, len(aps), chunk_size)]
+        logger.info(f"Claiming {len(aps)} devices to org inventory in {len(chunks)} request(s)...")
+        results = run_rows(api=self.api, func=self.claim_chunk, rows=chunks, engine=engine, concurrency=concurrency)
+        return [new_ap for claimed in results for new_ap in claimed]
+
+    def claim_chunk(self, aps: List[mist.accesspoint.AccessPoint]) -> List[mist.accesspoint.AccessPoint]:
+        """
+        Claim a single chunk of devices and map the claimed inventory entries back to the devices by MAC address
+
+        :param List[mist.accesspoint.AccessPoint] aps: Devices with a `claim_code` attribute
+        :return List[mist.accesspoint.AccessPoint]: The devices that were claimed
+        """
+        payload = [new_ap.claim_code for new_ap in aps]
+        try:
+            # Claiming is safe to send again: codes claimed by a lost attempt come back as duplicated, along with
+            # their inventory entry in this organization
+            res = self.api.http_post__(url=f"orgs/{self.org_id}/inventory", body=payload, idempotent=True)
+        except Exception as e:
+            logger.error(f"Exception occurred claiming {len(aps)} devices to org inventory: {e}")
+            return []
+        if res.status_code != 200:
+            for new_ap in aps:
+                logger.error(f"Could not claim {new_ap.hostname} - {new_ap.serial} to org, skipping.")
+            logger.error(f"Response: {res.content}")
+            return []
+        data = res.json()
+        added = set(code.upper() for code in data.get('added', []))
+        duplicated = set(code.upper() for code in data.get('duplicated', []))
+        inventory_added = dict()
+        for device in data.get('inventory_added', []):
+            inventory_added[mist.inventory.normalize_mac(device.get('mac'))] = device
+        # Devices of the duplicated codes which are already in this organization
+        inventory_duplicated = dict()
+        for device in data.get('inventory_duplicated', []):
+            inventory_duplicated[mist.inventory.normalize_mac(device.get('mac'))] = device
+        claimed = list()
+        for new_ap in aps:
+            magic = new_ap.claim_code.upper()
+            mac = mist.inventory.normalize_mac(new_ap.mac)
+            if magic in added and mac in inventory_added:
+                device = inventory_added[mac]
+                logger.info(f"Claimed {new_ap.hostname} - {new_ap.serial} to org inventory.")
+            elif magic in duplicated and mac in inventory_duplicated:
+                device = inventory_duplicated[mac]
+                logger.info(f"{new_ap.hostname} - {new_ap.serial} is already in the org inventory.")
+            elif magic in added:
+                logger.error(f"Claim code for {new_ap.hostname} - {new_ap.serial} was accepted but does not match "
+                             f"MAC address {new_ap.mac}, skipping.")
+                continue
+            elif magic in duplicated:
+                logger.error(f"Claim code for {new_ap.hostname} - {new_ap.serial} has already been claimed, skipping.")
+                continue
+            else:
+                logger.error(f"Could not claim {new_ap.hostname} - {new_ap.serial} to org, skipping.")
+                continue
+            logger.debug("Updating device attributes...")
+            new_ap.set_attributes(**device)
+            self.inventory.add(device)
+            if self.journal is not None:
+                self.journal.record(Journal.DEVICE, new_ap.serial, "claimed", mac=new_ap.mac)
+            claimed.append(new_ap)
+        return claimed
+
+    def assign_devices(self, site_id: str, aps: List[mist.accesspoint.AccessPoint],
+                       no_reassign: bool = False) -> List[mist.accesspoint.AccessPoint]:
+        """
+        Assign devices to a site with one inventory PUT per chunk of MAC addresses
+
+        :param str site_id: ID of the site the devices are assigned to
+        :param List[mist.accesspoint.AccessPoint] aps: Devices to assign
+        :param bool no_reassign: Do not move devices already assigned to another site
+        :return List[mist.accesspoint.AccessPoint]: The devices that were assigned
+        """
+        chunk_size = self.api.bulk_chunk_size
+        assigned = list()
+        for i in range(0, len(aps), chunk_size):
+            assigned.extend(self.assign_chunk((site_id, aps[i:i + chunk_size]), no_reassign=no_reassign))
+        return assigned
+
+    def assign_chunk(self, chunk: (str, List[mist.accesspoint.AccessPoint]),
+                     no_reassign: bool = False) -> List[mist.accesspoint.AccessPoint]:
+        """
+        Assign a single chunk of devices to a site and read the result of every MAC address from the response
+
+        :param (str, List[mist.accesspoint.AccessPoint]) chunk: ID of the site and the devices to assign to it
+        :param bool no_reassign: Do not move devices already assigned to another site
+        :return List[mist.accesspoint.AccessPoint]: The devices that were assigned
+        """
+        site_id, aps = chunk
+        payload = {
+            "op": "assign",
+            "site_id": site_id,
+            "macs": [new_ap.mac for new_ap in aps],
+            "no_reassign": no_reassign
+        }
+        try:
+            res = self.api.http_put__(url=f"orgs/{self.org_id}/inventory", body=payload)
+        except Exception as e:
+            logger.error(f"Exception occurred assigning {len(aps)} devices to site {site_id}: {e}")
+            return []
+        if res.status_code != 200:
+            for new_ap in aps:
+                logger.error(f"Could not assign {new_ap.hostname} - {new_ap.serial} to site {site_id}, skipping.")
+            logger.error(f"Response: {res.content}")
+            return []
+        success = set(mist.inventory.normalize_mac(mac) for mac in res.json().get('success', []))
+        assigned = list()
+        for new_ap in aps:
+            if mist.inventory.normalize_mac(new_ap.mac) in success:
+                new_ap.site_id = site_id
+                self.inventory.add({'serial': new_ap.serial, 'mac': new_ap.mac, 'site_id': site_id})
+                if self.journal is not None:
+                    self.journal.record(Journal.DEVICE, new_ap.serial, "assigned", site_id=site_id)
+                assigned.append(new_ap)
+            else:
+                logger.error(f"Could not assign {new_ap.hostname} - {new_ap.serial} to site {site_id}, skipping.")
+        logger.debug(f"Assigned {len(assigned)} of {len(aps)} devices to site {site_id}.")
+        return assigned
+
+    def rename_device(self, device: (Dict, mist.accesspoint.AccessPoint)) -> Optional[mist.accesspoint.AccessPoint]:
+        """
+        Rename a single device assigned to its site
+
+        :param (Dict, mist.accesspoint.AccessPoint) device: The CSV row of the device and the device built from it
+        :return Optional[mist.accesspoint.AccessPoint]: The provisioned device
+        """
+        ap, new_ap = device
+        if ap['hostname'] != new_ap.name:
+            if new_ap.rename(ap['hostname']) is True and self.journal is not None:
+                self.journal.record(Journal.DEVICE, new_ap.serial, "renamed", name=ap['hostname'])
+        else:
+            logger.debug(f"Device name already up to date for {new_ap.hostname}")
+        logger.debug(f"Finished privisioning device: {new_ap.hostname}")
+        return new_ap
+
+    def __device_step(self, new_ap: mist.accesspoint.AccessPoint, step: str) -> Optional[Dict]:
+        """
+        Retrieve a step of a device completed by a previous run recorded in the journal
+
+        :param mist.accesspoint.AccessPoint new_ap: The device
+        :param str step: Name of the step ('claimed', 'assigned' or 'renamed')
+        :return Optional[Dict]: The journal entry of the step, None if the step was not completed
+        """
+        if self.journal is None:
+            return None
+        return self.journal.get(Journal.DEVICE, new_ap.serial, step)
+
+    # Planning functions
+
+    def plan(self, sites_csv: Union[AnyStr, Path] = None, devices_csv: Union[AnyStr, Path] = None,
+             upsert: bool = False) -> Plan:
+        """
+        Compute the API calls needed to provision CSV files, without changing anything in the organization
+
+        :param Union[AnyStr, Path] sites_csv: A string or pathlib.Path reference to the sites CSV file
+        :param Union[AnyStr, Path] devices_csv: A string or pathlib.Path reference to the devices CSV file
+        :param bool upsert: Plan updates of the existing sites with the same name instead of new sites
+        :return Plan: The API calls needed and the steps that need none
+        """
+        self.preload(*(['sites', 'sitegroups', 'rftemplates'] if sites_csv else ['sites']),
+                     *(['inventory'] if devices_csv else []))
+        plan = Plan()
+        planned_sites = self.plan_sites(sites_csv, plan, upsert=upsert) if sites_csv else dict()
+        if devices_csv:
+            self.plan_devices(devices_csv, plan, planned_sites=planned_sites)
+        return plan
+
+    def plan_sites(self, csv_file: Union[AnyStr, Path], plan: Plan, upsert: bool = False) -> Dict[str, str]:
+        """
+        Add the API calls needed to create the sites of a CSV file to a plan
+
+        :param Union[AnyStr, Path] csv_file: A string or pathlib.Path reference to the CSV file location
+        :param Plan plan: The plan to complete
+        :param bool upsert: Plan updates of the existing sites with the same name instead of new sites
+        :return Dict[str, str]: Placeholder IDs of the sites to create, by name
+        """
+        planned_sites = dict()
+        addresses = set()
+        locations = set()
+        for idx, site in enumerate(iter_csv_file(csv_file=csv_file), start=1):
+            if self.__site_created(idx, site):
+                plan.skip(f"Site #{idx}: {site['name']}", "already created by a previous run")
+                continue
+            existing = self.__sites_by_name.get(site['name']) if upsert else None
+            if existing is not None:
+                self.__reuse_location(site, existing)
+            new_site = self.build_site(idx, site)
+            if new_site is None:
+                plan.skip(f"Site #{idx}: {site['name']}", "invalid coordinates")
+                continue
+            if new_site.geocoding_pending:
+                key = normalize_address(new_site.address)
+                cached = self.api.geo_cache.get(new_site.address) if self.api.geo_cache is not None else None
+                if key not in addresses and cached is None:
+                    plan.add('geocode', "GET", "maps/api/geocode/json", new_site.address)
+                    if self.api.tz_resolver is None:
+                        plan.add('timezone', "GET", "maps/api/timezone/json", new_site.address)
+                addresses.add(key)
+            elif new_site.location_pending and self.api.tz_resolver is None:
+                location = (new_site.lat, new_site.lng)
+                if location not in locations:
+                    plan.add('timezone', "GET", "maps/api/timezone/json", f"{new_site.lat},{new_site.lng}")
+                locations.add(location)
+            target = f"Site #{idx}: {new_site.name}"
+            if existing is not None:
+                # The location of a new address is only known once geocoded, the site will be updated anyway
+                if new_site.geocoding_pending:
+                    changes = ['address']
+                elif new_site.location_pending and self.api.tz_resolver is None:
+                    changes = ['timezone']
+                else:
+                    changes = list(new_site.diff(existing))
+                if changes:
+                    plan.add('update', "PUT", f"sites/{existing.site_id}", f"{target} ({', '.join(changes)})")
+                else:
+                    plan.skip(target, "already up to date")
+                continue
+            if new_site.name in self.__sites_by_name:
+                target += " (a site with this name already exists)"
+            site_id = f"<new site {new_site.name}>"
+            plan.add('create', "POST", f"orgs/{self.org_id}/sites", target)
+            planned_sites[new_site.name] = site_id
+        # Like verify_sites, with the organization grown by the planned sites
+        pages = self.verify_pages(planned=len(planned_sites))
+        if pages > len(planned_sites):
+            for name, site_id in planned_sites.items():
+                plan.add('verify', "GET", f"sites/{site_id}", f"Site: {name}")
+        elif planned_sites:
+            for page in range(1, pages + 1):
+                plan.add('verify', "GET", f"orgs/{self.org_id}/sites", f"{len(planned_sites)} new sites, page {page}")
+        return planned_sites
+
+    def plan_devices(self, csv_file: Union[AnyStr, Path], plan: Plan, planned_sites: Dict[str, str] = None):
+        """
+        Add the API calls needed to claim, assign and rename the devices of a CSV file to a plan
+
+        :param Union[AnyStr, Path] csv_file: A string or pathlib.Path reference to the CSV file location
+        :param Plan plan: The plan to complete
+        :param Dict[str, str] planned_sites: Placeholder IDs of the sites not created yet, by name
+        :returns None
+        """
+        chunk_size = self.api.bulk_chunk_size
+        for aps_csv_data in chunked(iter_csv_file(csv_file=csv_file), self.api.csv_chunk_size):
+            devices = self.resolve_devices(aps_csv_data, planned_sites=planned_sites)
+            unclaimed = [new_ap for _, new_ap, claim, _ in devices if claim]
+            for i in range(0, len(unclaimed), chunk_size):
+                plan.add('claim', "POST", f"orgs/{self.org_id}/inventory",
+                         ", ".join(new_ap.hostname for new_ap in unclaimed[i:i + chunk_size]))
+            sites = dict()
+            for ap, new_ap, claim, site_id in devices:
+                if claim or new_ap.site_id != site_id:
+                    sites.setdefault(site_id, list()).append(new_ap)
+                else:
+                    plan.skip(f"Device {new_ap.hostname}", f"already assigned to site {ap['site_name']}")
+                if ap['hostname'] != new_ap.name:
+                    plan.add('rename', "PUT", f"sites/{site_id}/devices/{new_ap.device_id}", new_ap.hostname)
+                else:
+                    plan.skip(f"Device {new_ap.hostname}", "name already up to date")
+            for site_id, site_aps in sites.items():
+                for i in range(0, len(site_aps), chunk_size):
+                    plan.add('assign', "PUT", f"orgs/{self.org_id}/inventory",
+                             ", ".join(new_ap.hostname for new_ap in site_aps[i:i + chunk_size]))
 
     # Computed properties
 
+    @property
+    def sites(self) -> List[mist.site.Site]:
+        if self.__sites is None:
+            self.get_sites()
+        return self.__sites
+
+    @property
+    def sitegroups(self) -> List[mist.sitegroup.Sitegroup]:
+        if self.__sitegroups is None:
+            self.get_sitegroups()
+        return self.__sitegroups
+
+    @property
+    def rftemplates(self) -> List[mist.rftemplate.RFTemplate]:
+        if self.__rftemplates is None:
+            self.get_rftemplates()
+        return self.__rftemplates
+
+    @property
+    def inventory(self) -> mist.inventory.Inventory:
+        if self.__inventory is None:
+            self.get_inventory()
+        return self.__inventory
+
     @property
     def to_mist(self) -> Dict:
         org_data = {
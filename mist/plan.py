@@ -0,0 +1,95 @@
+from math import ceil
+from typing import AnyStr, Dict, List, NamedTuple
+
+
+class Operation(NamedTuple):
+    """ A single API call the provisioning run will make """
+    stage: str
+    method: str
+    url: str
+    target: str
+
+
+class Plan(object):
+
+    """Set of API calls needed to provision CSV files, computed without changing anything"""
+
+    # Stages run one after the other, the calls of a stage run concurrently
+    STAGES = ('geocode', 'timezone', 'create', 'update', 'verify', 'claim', 'assign', 'rename')
+    GOOGLE_STAGES = ('geocode', 'timezone')
+
+    operations: List[Operation]
+    skipped: List[str]
+
+    def __init__(self):
+        self.operations = list()
+        self.skipped = list()
+
+    def add(self, stage: str, method: str, url: str, target: str):
+        """
+        Add an API call to the plan
+
+        :param str stage: Stage of the call, one of Plan.STAGES
+        :param str method: HTTP method of the call
+        :param str url: URL of the call, relative to the API base URL
+        :param str target: Description of the site or devices affected by the call
+        """
+        self.operations.append(Operation(stage=stage, method=method, url=url, target=target))
+
+    def skip(self, target: str, reason: str):
+        """
+        Record a step that needs no API call
+
+        :param str target: Description of the site or device
+        :param str reason: Why no call is needed
+        """
+        self.skipped.append(f"{target}: {reason}")
+
+    def calls(self, stage: str = None) -> int:
+        """
+        Number of Mist API calls of the plan
+
+        :param str stage: Only count the calls of this stage
+        :return int: The number of calls
+        """
+        if stage is not None:
+            return sum(1 for operation in self.operations if operation.stage == stage)
+        return sum(1 for operation in self.operations if operation.stage not in self.GOOGLE_STAGES)
+
+    def estimate(self, latency: float, concurrency: int = 1, geocode_concurrency: int = 10,
+                 hourly_limit: int = 5000, used: int = 0, pacing_start: int = None) -> float:
+        """
+        Estimate the wall time of the plan
+
+        :param float latency: Average number of seconds per API call
+        :param int concurrency: Maximum number of Mist API calls in flight
+        :param int geocode_concurrency: Maximum number of Google API calls in flight
+        :param int hourly_limit: Number of Mist API calls allowed per hour
+        :param int used: Number of Mist API calls already made during the last hour
+        :param int pacing_start: Number of Mist API calls per hour sent at full speed, the hourly limit if None
+        :return float: The estimated number of seconds
+        """
+        seconds = 0.0
+        for stage in self.STAGES:
+            stage_concurrency = geocode_concurrency if stage in self.GOOGLE_STAGES else concurrency
+            seconds += ceil(self.calls(stage) / max(1, stage_concurrency)) * latency
+        if pacing_start is None:
+            pacing_start = hourly_limit
+        # Calls past the pacing start are spread evenly over the hour, calls beyond the hourly limit wait for the
+        # oldest calls to leave the window
+        over = self.calls() - max(0, pacing_start - used)
+        paced = min(max(over, 0), hourly_limit - max(pacing_start, used))
+        if paced > 0:
+            seconds += paced * 3600 / (hourly_limit - pacing_start)
+        if over > paced:
+            seconds += (over - paced) * 3600 / hourly_limit
+        return seconds
+
+    def summary(self) -> Dict[str, int]:
+        return {stage: self.calls(stage) for stage in self.STAGES}
+
+    def __len__(self) -> int:
+        return len(self.operations)
+
+    def __str__(self) -> AnyStr:
+        return f"<{self.__class__.__name__} object - Operations: {len(self.operations)}, Skipped: {len(self.skipped)}>"
@@ -0,0 +1,251 @@
+from collections import deque
+from email.utils import parsedate_to_datetime
+from threading import Lock
+from time import monotonic, sleep, time
+from typing import Dict, Optional, Tuple
+from urllib.parse import urlparse
+import requests
+from mist import logger
+from mist.metrics import MeasuredAdapter, Metrics
+
+
+def parse_retry_after(value: Optional[str], default: float = 60) -> float:
+    """
+    Parse a Retry-After header given either in seconds or as an HTTP date
+
+    :param Optional[str] value: Value of the Retry-After header
+    :param float default: Number of seconds returned when the header is missing or invalid
+    :return float: Number of seconds to wait
+    """
+    if not value:
+        return default
+    try:
+        return max(float(value), 0)
+    except ValueError:
+        pass
+    try:
+        return max(parsedate_to_datetime(value).timestamp() - time(), 0)
+    except (TypeError, ValueError):
+        return default
+
+
+class TokenBucket(object):
+
+    """Thread-safe token bucket"""
+
+    rate: float
+    capacity: float
+
+    def __init__(self, rate: float, capacity: float):
+        """
+        Initialize the token bucket, full.
+
+        :param float rate: Number of tokens added per second
+        :param float capacity: Maximum number of tokens the bucket holds
+        """
+        self.rate = rate
+        self.capacity = capacity
+        self.__tokens = capacity
+        self.__updated = monotonic()
+        self.__paused_until = 0.0
+        self.__lock = Lock()
+
+    def __refill(self, now: float):
+        self.__tokens = min(self.capacity, self.__tokens + (now - self.__updated) * self.rate)
+        self.__updated = now
+
+    def acquire(self, tokens: float = 1) -> float:
+        """
+        Take tokens from the bucket, waiting until they are available
+
+        :param float tokens: Number of tokens to take
+        :return float: Number of seconds spent waiting
+        """
+        waited = 0.0
+        while True:
+            with self.__lock:
+                now = monotonic()
+                self.__refill(now)
+                wait = max(self.__paused_until - now, 0)
+                if not wait:
+                    if self.__tokens >= tokens:
+                        self.__tokens -= tokens
+                        return waited
+                    wait = (tokens - self.__tokens) / self.rate
+            sleep(wait)
+            waited += wait
+
+    def pause(self, seconds: float):
+        """
+        Hold every request on this bucket for a number of seconds
+
+        :param float seconds: Number of seconds to wait before the next request
+        """
+        with self.__lock:
+            self.__paused_until = max(self.__paused_until, monotonic() + seconds)
+            self.__tokens = 0
+
+    @property
+    def available(self) -> float:
+        with self.__lock:
+            self.__refill(monotonic())
+            return self.__tokens
+
+
+class RateLimiter(object):
+
+    """Request scheduler sharing one budget per endpoint class across every worker"""
+
+    MIST = "mist"
+    GOOGLE = "google"
+    WARNING_LEVELS = (0.5, 0.75, 0.9)
+
+    mist_hourly_limit: int = 5000
+    google_rate: float = 50
+    pacing_level: float = 0.5
+    retries: int = 0
+
+    def __init__(self, mist_hourly_limit: int = 5000, google_rate: float = 50, pacing_level: float = 0.5):
+        """
+        Initialize the rate limiter.
+
+        Mist allows a number of calls per token and per hour: requests go at full speed until the calls of the last
+        hour reach the pacing level, then the calls left are spread evenly over the time left until the oldest call
+        leaves the sliding window. No hour ever holds more calls than the limit. Google limits queries per second.
+
+        :param int mist_hourly_limit: Number of Mist API calls allowed per hour
+        :param float google_rate: Number of Google API queries allowed per second
+        :param float pacing_level: Share of the hourly limit sent at full speed before requests are paced
+        """
+        self.mist_hourly_limit = mist_hourly_limit
+        self.google_rate = google_rate
+        self.pacing_level = pacing_level
+        self.retries = 0
+        self.__last_call = None
+        self.__buckets: Dict[str, TokenBucket] = {
+            self.MIST: TokenBucket(rate=mist_hourly_limit / 3600, capacity=mist_hourly_limit),
+            self.GOOGLE: TokenBucket(rate=google_rate, capacity=google_rate)
+        }
+        self.__calls: Dict[str, deque] = {endpoint_class: deque() for endpoint_class in self.__buckets}
+        self.__warned = 0
+        self.__lock = Lock()
+
+    def classify(self, url: str) -> str:
+        """
+        Find the endpoint class of a request URL
+
+        :param str url: URL of the request
+        :return str: The endpoint class, either RateLimiter.MIST or RateLimiter.GOOGLE
+        """
+        parsed = urlparse(url)
+        if (parsed.hostname or '').endswith('googleapis.com') or parsed.path.startswith('/maps/api/'):
+            return self.GOOGLE
+        return self.MIST
+
+    def acquire(self, endpoint_class: str) -> float:
+        """
+        Wait until a request of an endpoint class is allowed and record it
+
+        :param str endpoint_class: The endpoint class of the request
+        :return float: Number of seconds spent waiting
+        """
+        waited = 0.0
+        while True:
+            # The bucket holds the requests while paused after a 429 response
+            waited += self.__buckets[endpoint_class].acquire()
+            now = monotonic()
+            with self.__lock:
+                calls = self.__calls[endpoint_class]
+                while calls and now - calls[0] >= 3600:
+                    calls.popleft()
+                if endpoint_class != self.MIST:
+                    calls.append(now)
+                    break
+                used = len(calls)
+                if used >= self.mist_hourly_limit:
+                    # The call slot is only taken once the oldest call of the window expires
+                    wait = calls[0] + 3600 - now
+                else:
+                    wait = 0.0
+                    if used >= self.pacing_start:
+                        interval = (calls[0] + 3600 - now) / (self.mist_hourly_limit - used)
+                        wait = max(self.__last_call + interval - now, 0) if self.__last_call is not None else 0
+                    if not wait:
+                        calls.append(now)
+                        self.__last_call = now
+                        used += 1
+                        break
+            sleep(wait)
+            waited += wait
+        if waited > 1:
+            logger.debug(f"Waited {waited:.1f}s for the {endpoint_class} rate limit.")
+        if endpoint_class == self.MIST:
+            self.__warn(used)
+        return waited
+
+    def __warn(self, used: int):
+        with self.__lock:
+            levels = [level for level in self.WARNING_LEVELS if used >= level * self.mist_hourly_limit]
+            if len(levels) <= self.__warned:
+                return
+            self.__warned = len(levels)
+        logger.warning(f"Used {used} of {self.mist_hourly_limit} Mist API calls allowed per hour, "
+                       f"requests are spread over the rest of the hour to stay under the limit.")
+
+    @property
+    def pacing_start(self) -> int:
+        """ Number of Mist API calls per hour sent at full speed before requests are paced """
+        return int(self.mist_hourly_limit * self.pacing_level)
+
+    def retry_after(self, endpoint_class: str, seconds: float):
+        """
+        Pause every request of an endpoint class after a 429 response, the request is counted as retried
+
+        :param str endpoint_class: The endpoint class of the request
+        :param float seconds: Number of seconds given by the Retry-After header
+        """
+        logger.warning(f"Rate limited by the {endpoint_class} API, pausing requests for {seconds:.0f}s...")
+        with self.__lock:
+            self.retries += 1
+        self.__buckets[endpoint_class].pause(seconds)
+
+    def usage(self, endpoint_class: str = MIST) -> Tuple[int, int]:
+        """
+        Number of calls made during the last hour
+
+        :param str endpoint_class: The endpoint class
+        :return Tuple[int, int]: Number of calls made during the last hour and the hourly limit
+        """
+        now = monotonic()
+        with self.__lock:
+            calls = self.__calls[endpoint_class]
+            while calls and now - calls[0] >= 3600:
+                calls.popleft()
+            used = len(calls)
+        limit = self.mist_hourly_limit if endpoint_class == self.MIST else int(self.google_rate * 3600)
+        return used, limit
+
+
+class RateLimitedAdapter(MeasuredAdapter):
+
+    """HTTP adapter sending requests through a shared rate limiter and honoring 429 Retry-After responses"""
+
+    def __init__(self, rate_limiter: RateLimiter, max_rate_limit_retries: int = 5, metrics: Metrics = None, **kwargs):
+        self.rate_limiter = rate_limiter
+        self.max_rate_limit_retries = max_rate_limit_retries
+        super(RateLimitedAdapter, self).__init__(metrics=metrics, **kwargs)
+
+    def send(self, request: requests.PreparedRequest, **kwargs) -> requests.Response:
+        endpoint_class = self.rate_limiter.classify(request.url)
+        attempt = 0
+        while True:
+            self.rate_limiter.acquire(endpoint_class)
+            response = super(RateLimitedAdapter, self).send(request, **kwargs)
+            # A 429 response was not processed by the server, so any method can safely be sent again
+            if response.status_code != 429 or attempt >= self.max_rate_limit_retries:
+                return response
+            attempt += 1
+            if self.metrics is not None:
+                self.metrics.retry(request.method, request.url)
+            self.rate_limiter.retry_after(endpoint_class, parse_retry_after(response.headers.get('Retry-After')))
+            response.close()
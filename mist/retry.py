@@ -0,0 +1,88 @@
+from random import uniform
+from threading import Lock
+from typing import Optional
+import requests
+from mist import logger
+
+
+class RetryPolicy(object):
+
+    """Retry policy with exponential backoff, jitter and a retry budget shared by the whole run"""
+
+    IDEMPOTENT_METHODS = frozenset(['GET', 'PUT', 'DELETE'])
+    RETRY_STATUSES = frozenset([500, 502, 503, 504])
+
+    max_retries: int = 3
+    backoff_factor: float = 0.5
+    max_backoff: float = 30
+    budget: int = 100
+    retries: int = 0
+
+    def __init__(self, max_retries: int = 3, backoff_factor: float = 0.5, max_backoff: float = 30,
+                 budget: int = 100):
+        """
+        Initialize the retry policy.
+
+        :param int max_retries: Maximum number of retries of a single request
+        :param float backoff_factor: Base delay in seconds, doubled on every attempt
+        :param float max_backoff: Maximum delay in seconds between two attempts
+        :param int budget: Maximum number of retries for the whole run
+        """
+        self.max_retries = max_retries
+        self.backoff_factor = backoff_factor
+        self.max_backoff = max_backoff
+        self.budget = budget
+        self.retries = 0
+        self.__exhausted = False
+        self.__lock = Lock()
+
+    def backoff(self, attempt: int) -> float:
+        """
+        Delay before the next attempt, with full jitter so parallel workers do not retry in lockstep
+
+        :param int attempt: Number of attempts already retried
+        :return float: Number of seconds to wait
+        """
+        return uniform(0, min(self.max_backoff, self.backoff_factor * (2 ** attempt)))
+
+    def should_retry(self, method: str, attempt: int, response: requests.Response = None,
+                     exception: Exception = None, idempotent: Optional[bool] = None) -> bool:
+        """
+        Decide whether a failed request is sent again, and take the retry from the budget if so
+
+        Requests that never reached the server are always safe to send again. Other failures are only retried for
+        idempotent requests: GET, PUT and DELETE, unless the caller states otherwise.
+
+        :param str method: HTTP method of the request
+        :param int attempt: Number of attempts already retried
+        :param requests.Response response: The response received, if any
+        :param Exception exception: The exception raised while sending the request, if any
+        :param Optional[bool] idempotent: Whether the request can safely be sent twice, defaults to the method
+        :return bool: Whether the request should be sent again
+        """
+        if attempt >= self.max_retries:
+            return False
+        if idempotent is None:
+            idempotent = method.upper() in self.IDEMPOTENT_METHODS
+        if exception is not None:
+            if isinstance(exception, requests.exceptions.ConnectTimeout):
+                retryable = True
+            else:
+                retryable = idempotent and isinstance(exception, (requests.exceptions.ConnectionError,
+                                                                  requests.exceptions.Timeout,
+                                                                  ConnectionError))
+        elif response is not None:
+            retryable = idempotent and response.status_code in self.RETRY_STATUSES
+        else:
+            retryable = False
+        if not retryable:
+            return False
+        with self.__lock:
+            if self.retries >= self.budget:
+                exhausted, self.__exhausted = self.__exhausted, True
+            else:
+                self.retries += 1
+                return True
+        if not exhausted:
+            logger.warning(f"Retry budget of {self.budget} retries exhausted, failed requests are no longer retried.")
+        return False
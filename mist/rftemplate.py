@@ -1,23 +1,26 @@
 import mist.api
+from mist.model import Model
 from typing import AnyStr, Dict
 
 
-class RFTemplate(object):
+class RFTemplate(Model):
 
     """Mist RF Template Object"""
 
+    __slots__ = ('name', 'api', 'rftemplate_id', 'org_id')
+
     name: str
     api: mist.api.API
-    rftemplate_id: str = None
-    org_id: str = None
+    rftemplate_id: str
+    org_id: str
 
     def __init__(self, name: str, api: mist.api.API, rftemplate_id: str = None, org_id: str = None, **kwargs):
         self.name = name
         self.api = api
         self.rftemplate_id = rftemplate_id
         self.org_id = org_id
-        for k, v in kwargs.items():
-            setattr(self, k, v)
+        super(RFTemplate, self).__init__()
+        self.set_attributes(**kwargs)
 
     @property
     def settings(self) -> Dict:
@@ -30,14 +33,15 @@ class RFTemplate(object):
             "id": self.rftemplate_id,
             "name": self.name,
             "org_id": self.org_id,
-            "ant_gain_5": self.__dict__.get('ant_gain_5', 0),
-            "ant_gain_24": self.__dict__.get('ant_gain_24', 0),
-            "model_specific": self.__dict__.get('model_specific', {}),
-            "band_5": self.__dict__.get('band_5'),
-            "band_24": self.__dict__.get('band_24')
+            "ant_gain_5": getattr(self, 'ant_gain_5', 0),
+            "ant_gain_24": getattr(self, 'ant_gain_24', 0),
+            "model_specific": getattr(self, 'model_specific', {}),
+            "band_5": getattr(self, 'band_5', None),
+            "band_24": getattr(self, 'band_24', None)
         }
-        if 'country_code' in self.__dict__ and len(self.__dict__['country_code']) == 2:
-            rft_data['country_code'] = self.__dict__['country_code']
+        country_code = getattr(self, 'country_code', None)
+        if country_code and len(country_code) == 2:
+            rft_data['country_code'] = country_code
         return rft_data
 
     def __repr__(self) -> AnyStr:
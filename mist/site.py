@@ -1,53 +1,139 @@
+from time import sleep
+from typing import Iterable, Optional, Set
+import requests
 import mist.api
-from src.utils import get_geo_info
+from mist.model import Model
+from mist.retry import RetryPolicy
 from src import logger
 
 
-class Site(object):
+class Site(Model):
 
     """Mist Site Object"""
 
+    __slots__ = ('name', 'api', 'site_id', 'org_id', 'lat', 'lng', 'timezone', 'country_code', 'sitegroup_ids',
+                 'rftemplate_id', 'secpolicy_id', 'alarmtemplate_id', 'networktemplate_id', '__address')
+
     name: str
     api: mist.api.API
     site_id: str
-    org_id: str = None
-    lat: float = None
-    lng: float = None
-    timezone: str = None
-    country_code: str = None
-    sitegroup_ids: [str] = None
-    __address: str = None
+    org_id: str
+    lat: float
+    lng: float
+    timezone: str
+    country_code: str
+    sitegroup_ids: [str]
+    rftemplate_id: str
+    # Fields compared with the existing site when upserting
+    UPSERT_FIELDS = ('name', 'address', 'latlng', 'timezone', 'country_code')
 
     def __init__(self, name: str, api: mist.api.API, site_id: str = None, org_id: str = None, **kwargs):
         self.name = name
         self.api = api
         self.site_id = site_id
         self.org_id = org_id
-        for k, v in kwargs.items():
-            if k == 'address':
-                self.__address = v
-            elif k == 'latlng':
-                self.lat = v.get('lat')
-                self.lng = v.get('lng')
-            else:
-                setattr(self, k, v)
-        if self.__address:
-            logger.debug(f"Getting location information for site: {self.name}")
-            self.__update_location__(address=self.__address)
-            logger.debug(f"Location information updated for site: {self.name}")
-        logger.debug(f"Finished building site: {self.name}")
+        self.lat = self.lng = self.timezone = self.country_code = self.sitegroup_ids = None
+        self.rftemplate_id = self.secpolicy_id = self.alarmtemplate_id = self.networktemplate_id = None
+        self.__address = None
+        super(Site, self).__init__()
+        self.set_attributes(**kwargs)
+        # Geocoding is deferred until the location is needed, see Organization.geocode_sites
+        if self.location_pending:
+            logger.debug(f"Location information pending for site: {self.name}")
 
-    # TODO: write function to save changes
-    # def update(self) -> bool:
-    #     try:
-    #         res = self.api.http_put__(url=f"sites/{self.site_id}/s")
+    def set_attributes(self, **kwargs):
+        if 'address' in kwargs:
+            self.__address = kwargs.pop('address')
+        if 'latlng' in kwargs:
+            latlng = kwargs.pop('latlng')
+            self.lat = latlng.get('lat')
+            self.lng = latlng.get('lng')
+        if kwargs:
+            super(Site, self).set_attributes(**kwargs)
 
-    def create(self) -> (bool, dict):
+    def update(self, changes: dict) -> (bool, dict):
         try:
-            res = self.api.http_post__(url=f"orgs/{self.org_id}/sites", body=self.to_mist)
+            res = self.api.http_put__(url=f"sites/{self.site_id}", body=changes)
         except Exception:
             raise
         res_data = res.json()
+        if res.status_code == 200:
+            status = True
+        else:
+            status = False
+        return status, res_data
+
+    def diff(self, current: 'Site') -> dict:
+        """
+        Compare the site with the current state of the same site in the Mist cloud
+
+        Only the fields set from the CSV file are compared, site groups and RF template are left untouched when
+        their column is empty.
+
+        :param Site current: The site as returned by the Mist API
+        :return dict: The fields to change, with their new value
+        """
+        self.resolve_location()
+        desired = self.to_mist
+        existing = {
+            "name": current.name,
+            "address": current.address,
+            "latlng": current.latlng,
+            "timezone": current.timezone,
+            "country_code": current.country_code,
+            "sitegroup_ids": current.sitegroup_ids,
+            "rftemplate_id": getattr(current, 'rftemplate_id', None)
+        }
+        fields = list(self.UPSERT_FIELDS) + [field for field in ('sitegroup_ids', 'rftemplate_id')
+                                             if getattr(self, field) is not None]
+        return {field: desired.get(field) for field in fields
+                if self.__comparable(desired.get(field)) != self.__comparable(existing.get(field))}
+
+    @staticmethod
+    def __comparable(value):
+        if isinstance(value, list):
+            return sorted(value) or None
+        if isinstance(value, dict):
+            return {k: round(v, 6) if isinstance(v, float) else v for k, v in value.items()}
+        return value
+
+    def create(self, existing_ids: Iterable[str] = ()) -> (bool, dict):
+        """
+        Create the site in the Mist cloud
+
+        A POST is not safe to send twice: after a server error or a lost response, the sites of the organization are
+        searched for this one before it is sent again.
+
+        :param Iterable[str] existing_ids: IDs of the sites with the same name which existed before this one
+        :return (bool, dict): Whether the site was created, and the site or the error returned by the Mist API
+        """
+        self.resolve_location()
+        url = f"orgs/{self.org_id}/sites"
+        attempt = 0
+        while True:
+            try:
+                res, error = self.api.http_post__(url=url, body=self.to_mist), None
+            except requests.exceptions.RequestException as e:
+                res, error = None, e
+            if res is not None and res.status_code not in RetryPolicy.RETRY_STATUSES:
+                break
+            created = self.__find_created(existing_ids=set(existing_ids))
+            if created is not None:
+                logger.info(f"Site {self.name} was created despite the failed request, using it.")
+                self.site_id = created['id']
+                return True, created
+            if not self.api.retry_policy.should_retry("POST", attempt, response=res, exception=error,
+                                                      idempotent=True):
+                if error is not None:
+                    raise error
+                break
+            delay = self.api.retry_policy.backoff(attempt)
+            attempt += 1
+            self.api.metrics.retry("POST", url)
+            logger.warning(f"Retrying creation of site {self.name} in {delay:.1f}s after "
+                           f"{error or f'response {res.status_code}'} (retry {attempt})...")
+            sleep(delay)
+        res_data = res.json()
         if res.status_code == 200:
             self.site_id = res_data['id']
             status = True
@@ -55,6 +141,18 @@ class Site(object):
             status = False
         return status, res_data
 
+    def __find_created(self, existing_ids: Set[str]) -> Optional[dict]:
+        """
+        Search the sites of the organization for this site, created by a request which seemed to fail
+
+        :param Set[str] existing_ids: IDs of the sites with the same name which existed before this one
+        :return Optional[dict]: The site as returned by the Mist API, None if it was not created
+        """
+        for site_data in self.api.http_get_paginated__(f"orgs/{self.org_id}/sites"):
+            if site_data.get('name') == self.name and site_data.get('id') not in existing_ids:
+                return site_data
+        return None
+
     def delete(self) -> (bool, dict):
         try:
             res = self.api.http_delete__(url=f"sites/{self.site_id}")
@@ -68,15 +166,36 @@ class Site(object):
         return status, res_data
 
     def __update_location__(self, address: str):
-        addr_data, tz_data = get_geo_info(address=address, api_key=self.api.google_api_token)
-        try:
-            self.country_code = addr_data.country
-            self.timezone = tz_data.get('timeZoneId')
-            self.__address = addr_data.address
-            self.lat = addr_data.lat
-            self.lng = addr_data.lng
-        except Exception:
-            raise
+        geo_info = self.api.geocode(address=address)
+        self.country_code = geo_info.country
+        self.timezone = geo_info.timezone
+        self.__address = geo_info.address
+        self.lat = geo_info.lat
+        self.lng = geo_info.lng
+
+    def resolve_location(self):
+        """
+        Geocode the address of the site if its location is not known yet
+
+        Coordinates already set, e.g. from the CSV file, are kept and only their timezone is looked up.
+
+        :returns None
+        """
+        if self.geocoding_pending:
+            logger.debug(f"Getting location information for site: {self.name}")
+            self.__update_location__(address=self.__address)
+            logger.debug(f"Location information updated for site: {self.name}")
+        elif self.location_pending:
+            logger.debug(f"Getting timezone for site: {self.name}")
+            self.timezone = self.api.timezone(lat=self.lat, lng=self.lng)
+
+    @property
+    def location_pending(self) -> bool:
+        return bool(self.__address) and (self.lat is None or self.lng is None or not self.timezone)
+
+    @property
+    def geocoding_pending(self) -> bool:
+        return bool(self.__address) and (self.lat is None or self.lng is None)
 
     @property
     def address(self) -> str:
@@ -84,7 +203,8 @@ class Site(object):
 
     @address.setter
     def address(self, new_address: str):
-        self.__update_location__(address=new_address)
+        self.__address = new_address
+        self.lat = self.lng = self.timezone = None
 
     @property
     def latlng(self) -> dict:
@@ -155,16 +275,9 @@ class Site(object):
         }
         if self.site_id:
             site_data['id'] = self.site_id
-        if 'sitegroup_ids' in self.__dict__:
-            site_data['sitegroup_ids'] = self.__dict__['sitegroup_ids']
-        if 'rftemplate_id' in self.__dict__:
-            site_data['rftemplate_id'] = self.__dict__['rftemplate_id']
-        if 'secpolicy_id' in self.__dict__:
-            site_data['secpolicy_id'] = self.__dict__['secpolicy_id']
-        if 'alarmtemplate_id' in self.__dict__:
-            site_data['alarmtemplate_id'] = self.__dict__['alarmtemplate_id']
-        if 'networktemplate_id' in self.__dict__:
-            site_data['networktemplate_id'] = self.__dict__['networktemplate_id']
+        for field in ('rftemplate_id', 'secpolicy_id', 'alarmtemplate_id', 'networktemplate_id'):
+            if getattr(self, field) is not None:
+                site_data[field] = getattr(self, field)
         return site_data
 
     def __repr__(self):
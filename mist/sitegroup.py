@@ -1,23 +1,29 @@
 import mist.api
+from mist.model import Model
 from typing import AnyStr, Dict
 
 
-class Sitegroup(object):
+class Sitegroup(Model):
 
     """Mist Sitegroup Object"""
 
+    __slots__ = ('name', 'org_id', 'api', 'sitegroup_id', 'site_ids')
+
     name: str
     org_id: str
     api: mist.api.API
-    sitegroup_id: str = None
-    site_ids: [str] = None
+    sitegroup_id: str
+    site_ids: [str]
 
-    def __init__(self, name: str, org_id: str, api: mist.api.API, sitegroup_id: str = None, site_ids: [str] = None):
+    def __init__(self, name: str, org_id: str, api: mist.api.API, sitegroup_id: str = None, site_ids: [str] = None,
+                 **kwargs):
         self.name = name
         self.org_id = org_id
         self.api = api
         self.sitegroup_id = sitegroup_id
         self.site_ids = site_ids
+        super(Sitegroup, self).__init__()
+        self.set_attributes(**kwargs)
 
     @property
     def settings(self) -> Dict:
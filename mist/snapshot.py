@@ -0,0 +1,264 @@
+import json
+import re
+import sqlite3
+from pathlib import Path
+from threading import Lock
+from time import time
+from typing import Any, AnyStr, Dict, Iterator, List, Optional
+from uuid import uuid4
+from mist import logger
+
+
+class OrgSnapshot(object):
+
+    """
+    Persistent SQLite snapshot of the organization collections, used to warm start the next runs
+
+    Collections are stored one page of items per row, written while they are streamed from the Mist API and swapped in
+    once complete, so neither a whole collection nor one huge row is ever held in memory.
+    """
+
+    # Separates the collection name from the fetch ID of the pages not swapped in yet
+    STAGING = '#'
+
+    DEFAULT_TTLS = {
+        'token': 3600,
+        'org': 86400,
+        'sites': 3600,
+        'sitegroups': 86400,
+        'rftemplates': 86400,
+        'inventory': 300
+    }
+    # Collections changed by a write request, matched on the URL relative to the API base URL
+    WRITES = (
+        (re.compile(r'^orgs/[^/]+/(sites|sitegroups|rftemplates|inventory)\b'), None),
+        (re.compile(r'^sites/[^/]+/devices\b'), 'inventory'),
+        (re.compile(r'^sites/[^/?]+$'), 'sites'),
+        (re.compile(r'^orgs/[^/?]+$'), 'org')
+    )
+
+    file: Path
+    owner: str
+    ttls: Dict[str, int]
+    revalidate: bool = True
+
+    def __init__(self, filename: AnyStr, owner: str, ttls: Dict[str, int] = None, revalidate: bool = True):
+        """
+        Initialize the snapshot.
+
+        :param AnyStr filename: The path of the SQLite database file (either relative or absolute)
+        :param str owner: Fingerprint of the API token, snapshots of other tokens are never used
+        :param Dict[str, int] ttls: Number of seconds each collection stays valid, merged with the defaults
+        :param bool revalidate: Whether collections loaded from the snapshot are refetched in the background
+        """
+        self.file = Path(filename).expanduser().absolute()
+        self.owner = owner
+        self.ttls = dict(self.DEFAULT_TTLS, **(ttls or {}))
+        self.revalidate = revalidate
+        self.__generations: Dict[str, int] = {collection: 0 for collection in self.ttls}
+        self.__lock = Lock()
+        self.__db = sqlite3.connect(str(self.file), check_same_thread=False)
+        with self.__lock, self.__db:
+            columns = [row[1] for row in self.__db.execute("PRAGMA table_info(snapshot)")]
+            if columns and 'page' not in columns:
+                # Snapshot of an older version holding every collection in one row, it is only a cache
+                self.__db.execute("DROP TABLE snapshot")
+            self.__db.execute("CREATE TABLE IF NOT EXISTS snapshot ("
+                              "owner TEXT, org_id TEXT, collection TEXT, page INTEGER, data TEXT, fetched REAL, "
+                              "PRIMARY KEY (owner, org_id, collection, page))")
+            # Pages staged by an interrupted run
+            self.__db.execute("DELETE FROM snapshot WHERE instr(collection, ?) > 0", (self.STAGING,))
+        logger.debug(f"Opened organization snapshot {self.file}.")
+
+    def __expired(self, collection: str, fetched: float) -> bool:
+        return time() - fetched > self.ttls.get(collection, 0)
+
+    def get(self, org_id: str, collection: str) -> Optional[Any]:
+        """
+        Retrieve a single value of an organization from the snapshot, e.g. the organization itself
+
+        :param str org_id: ID of the organization
+        :param str collection: Name of the value
+        :return Optional[Any]: The value as returned by the Mist API, None if it is missing or expired
+        """
+        with self.__lock:
+            row = self.__db.execute("SELECT data, fetched FROM snapshot WHERE owner = ? AND org_id = ? AND "
+                                    "collection = ? AND page = 0", (self.owner, org_id, collection)).fetchone()
+        if row is None or self.__expired(collection, row[1]):
+            return None
+        logger.debug(f"Using the {collection} snapshot of organization {org_id}, {time() - row[1]:.0f}s old.")
+        return json.loads(row[0])
+
+    def set(self, org_id: str, collection: str, data: Any, generation: int = None):
+        """
+        Store a single value of an organization in the snapshot, e.g. the organization itself
+
+        :param str org_id: ID of the organization
+        :param str collection: Name of the value
+        :param Any data: The value as returned by the Mist API
+        :param int generation: Generation of the value when the fetch started, the data is dropped if the value was
+            written to since
+        """
+        serialized = json.dumps(data)
+        with self.__lock:
+            if generation is not None and generation != self.__generations.get(collection, 0):
+                logger.debug(f"Not storing the {collection} snapshot, the collection changed while it was fetched.")
+                return
+            with self.__db:
+                self.__db.execute("DELETE FROM snapshot WHERE owner = ? AND org_id = ? AND collection = ?",
+                                  (self.owner, org_id, collection))
+                self.__db.execute("INSERT INTO snapshot VALUES (?, ?, ?, 0, ?, ?)",
+                                  (self.owner, org_id, collection, serialized, time()))
+
+    def iter_items(self, org_id: str, collection: str) -> Optional[Iterator[Any]]:
+        """
+        Stream the items of a collection of an organization from the snapshot
+
+        The pages are read at once, so a write meanwhile never truncates the collection, and only parsed as the
+        items are consumed.
+
+        :param str org_id: ID of the organization
+        :param str collection: Name of the collection
+        :return Optional[Iterator[Any]]: The items as returned by the Mist API, None if the collection is missing or
+            expired
+        """
+        with self.__lock:
+            rows = self.__db.execute("SELECT data, fetched FROM snapshot WHERE owner = ? AND org_id = ? AND "
+                                     "collection = ? ORDER BY page", (self.owner, org_id, collection)).fetchall()
+        if not rows or self.__expired(collection, rows[0][1]):
+            return None
+        logger.debug(f"Using the {collection} snapshot of organization {org_id}, {time() - rows[0][1]:.0f}s old.")
+        return (item for data, _ in rows for item in json.loads(data))
+
+    def writer(self, org_id: str, collection: str, generation: int = None, page_size: int = 1000) -> 'SnapshotWriter':
+        """
+        Start storing a collection of an organization, one page of items at a time
+
+        :param str org_id: ID of the organization
+        :param str collection: Name of the collection
+        :param int generation: Generation of the collection when the fetch started, the data is dropped if the
+            collection was written to since
+        :param int page_size: Number of items per row
+        :return SnapshotWriter: The writer of the collection
+        """
+        return SnapshotWriter(self, org_id, collection, generation=generation, page_size=page_size)
+
+    def _write_page(self, org_id: str, staging: str, page: int, data: str):
+        with self.__lock, self.__db:
+            self.__db.execute("INSERT OR REPLACE INTO snapshot VALUES (?, ?, ?, ?, ?, 0)",
+                              (self.owner, org_id, staging, page, data))
+
+    def _swap(self, org_id: str, collection: str, staging: str, pages: int, generation: int = None) -> bool:
+        """
+        Replace a collection with its staged pages, in one transaction
+
+        :return bool: Whether the staged pages were swapped in, they are dropped otherwise
+        """
+        with self.__lock, self.__db:
+            staged = self.__db.execute("SELECT COUNT(*) FROM snapshot WHERE owner = ? AND org_id = ? AND "
+                                       "collection = ?", (self.owner, org_id, staging)).fetchone()[0]
+            if generation is not None and generation != self.__generations.get(collection, 0):
+                logger.debug(f"Not storing the {collection} snapshot, the collection changed while it was fetched.")
+            elif staged != pages:
+                logger.debug(f"Not storing the {collection} snapshot, pages are missing.")
+            else:
+                self.__db.execute("DELETE FROM snapshot WHERE owner = ? AND org_id = ? AND collection = ?",
+                                  (self.owner, org_id, collection))
+                self.__db.execute("UPDATE snapshot SET collection = ?, fetched = ? WHERE owner = ? AND org_id = ? "
+                                  "AND collection = ?", (collection, time(), self.owner, org_id, staging))
+                return True
+            self.__db.execute("DELETE FROM snapshot WHERE owner = ? AND org_id = ? AND collection = ?",
+                              (self.owner, org_id, staging))
+            return False
+
+    def _drop(self, org_id: str, staging: str):
+        with self.__lock, self.__db:
+            self.__db.execute("DELETE FROM snapshot WHERE owner = ? AND org_id = ? AND collection = ?",
+                              (self.owner, org_id, staging))
+
+    def generation(self, collection: str) -> int:
+        """
+        Number of times a collection was written to during this run
+
+        :param str collection: Name of the collection
+        :return int: The generation of the collection
+        """
+        with self.__lock:
+            return self.__generations.get(collection, 0)
+
+    def invalidate(self, collection: str):
+        """
+        Drop a collection from the snapshot of every organization
+
+        :param str collection: Name of the collection
+        """
+        with self.__lock:
+            self.__generations[collection] = self.__generations.get(collection, 0) + 1
+            with self.__db:
+                self.__db.execute("DELETE FROM snapshot WHERE owner = ? AND collection = ?", (self.owner, collection))
+
+    def invalidate_url(self, url: str):
+        """
+        Drop the collection changed by a write request
+
+        :param str url: URL of the request, relative to the API base URL
+        """
+        for pattern, collection in self.WRITES:
+            match = pattern.match(url)
+            if match:
+                self.invalidate(collection or match.group(1))
+                return
+
+    def close(self):
+        with self.__lock:
+            self.__db.close()
+
+    def __str__(self):
+        return f"<{self.__class__.__name__} object - File: '{self.file}'>"
+
+
+class SnapshotWriter(object):
+
+    """Stores the items of a collection as they are streamed, swapped in the snapshot once the collection is complete"""
+
+    def __init__(self, snapshot: OrgSnapshot, org_id: str, collection: str, generation: int = None,
+                 page_size: int = 1000):
+        self.snapshot = snapshot
+        self.org_id = org_id
+        self.collection = collection
+        self.generation = generation
+        self.page_size = max(1, page_size)
+        self.__staging = f"{collection}{OrgSnapshot.STAGING}{uuid4().hex}"
+        # Items are serialized as they are added, so the caller may change them afterwards
+        self.__items: List[str] = list()
+        self.__pages = 0
+        self.__done = False
+
+    def add(self, item: Any):
+        self.__items.append(json.dumps(item))
+        if len(self.__items) >= self.page_size:
+            self.__flush()
+
+    def __flush(self):
+        self.snapshot._write_page(self.org_id, self.__staging, self.__pages, f"[{','.join(self.__items)}]")
+        self.__pages += 1
+        self.__items = list()
+
+    def commit(self) -> bool:
+        """
+        Swap the collection in the snapshot, unless it was written to since the fetch started
+
+        :return bool: Whether the collection was stored
+        """
+        # An empty collection is stored as one empty page, so it is cached too
+        if self.__items or not self.__pages:
+            self.__flush()
+        self.__done = True
+        return self.snapshot._swap(self.org_id, self.collection, self.__staging, self.__pages,
+                                   generation=self.generation)
+
+    def close(self):
+        """ Drop the pages of a collection which was not completely fetched """
+        if not self.__done:
+            self.__done = True
+            self.snapshot._drop(self.org_id, self.__staging)
@@ -0,0 +1,117 @@
+import re
+from collections import Counter
+from threading import Lock
+from typing import Dict, Optional, Tuple
+from urllib.parse import urlparse
+import requests
+from requests.adapters import BaseAdapter
+
+UUID = re.compile(r'^[0-9a-fA-F]{8}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{12}$')
+# Placeholder of an ID, named after the collection it follows in the URL
+ID_PLACEHOLDERS = {
+    'orgs': "{org_id}",
+    'sites': "{site_id}",
+    'devices': "{device_id}",
+    'sitegroups': "{sitegroup_id}",
+    'rftemplates': "{rftemplate_id}"
+}
+
+
+def endpoint_template(url: str) -> str:
+    """
+    Reduce a request URL to its endpoint template, e.g. 'sites/{site_id}/devices/{device_id}'
+
+    IDs are replaced by placeholders and the query string is dropped. Google API URLs are reduced to
+    'google/<api>', e.g. 'google/geocode'.
+
+    :param str url: URL of the request, either absolute or relative to the API base URL
+    :return str: The endpoint template
+    """
+    path = urlparse(url).path
+    if path.startswith('/maps/api/'):
+        return f"google/{path[len('/maps/api/'):].split('/')[0]}"
+    if path.startswith('/api/v1/'):
+        path = path[len('/api/v1/'):]
+    segments = path.strip('/').split('/')
+    for index, segment in enumerate(segments):
+        if index > 0 and UUID.match(segment):
+            segments[index] = ID_PLACEHOLDERS.get(segments[index - 1], "{id}")
+    return '/'.join(segments)
+
+
+class CallRecorder(object):
+
+    """Thread-safe count of the requests sent, by HTTP method and endpoint template"""
+
+    def __init__(self):
+        self.__calls: Counter = Counter()
+        self.__lock = Lock()
+
+    def record(self, method: str, url: str):
+        """
+        Count a request
+
+        :param str method: HTTP method of the request
+        :param str url: URL of the request
+        """
+        key = (method.upper(), endpoint_template(url))
+        with self.__lock:
+            self.__calls[key] += 1
+
+    def count(self, method: Optional[str] = None, template: Optional[str] = None, google: Optional[bool] = None) -> int:
+        """
+        Number of requests recorded, optionally filtered
+
+        :param Optional[str] method: Only count the requests with this HTTP method
+        :param Optional[str] template: Only count the requests to this endpoint template
+        :param Optional[bool] google: Only count the Google API requests if True, or the Mist API requests if False
+        :return int: The number of requests
+        """
+        with self.__lock:
+            calls = list(self.__calls.items())
+        return sum(count for (call_method, call_template), count in calls
+                   if (method is None or call_method == method.upper())
+                   and (template is None or call_template == template)
+                   and (google is None or call_template.startswith('google/') == google))
+
+    @property
+    def calls(self) -> Dict[Tuple[str, str], int]:
+        """ Number of requests by HTTP method and endpoint template, as a new dict """
+        with self.__lock:
+            return dict(self.__calls)
+
+    def reset(self):
+        with self.__lock:
+            self.__calls.clear()
+
+    def __len__(self) -> int:
+        return self.count()
+
+    def __str__(self):
+        return f"<{self.__class__.__name__} object - Calls: {len(self)}>"
+
+
+class RecordingTransport(BaseAdapter):
+
+    """Transport adapter recording every request before handing it to the adapter it wraps"""
+
+    adapter: BaseAdapter
+    recorder: CallRecorder
+
+    def __init__(self, adapter: BaseAdapter, recorder: CallRecorder):
+        """
+        Initialize the recording transport.
+
+        :param BaseAdapter adapter: The adapter sending the requests, e.g. the rate limited adapter of the session
+        :param CallRecorder recorder: The recorder counting the requests
+        """
+        super(RecordingTransport, self).__init__()
+        self.adapter = adapter
+        self.recorder = recorder
+
+    def send(self, request: requests.PreparedRequest, **kwargs) -> requests.Response:
+        self.recorder.record(request.method, request.url)
+        return self.adapter.send(request, **kwargs)
+
+    def close(self):
+        self.adapter.close()
@@ -11,9 +11,11 @@
 import sys
 # Module imports
 from mist import Mist  # Mist object
+from mist.journal import Journal  # Journal of completed provisioning steps
 from src import logger  # Custom logging object
 from src import cli_parser  # Function to parse command-line options
-from src.provision import provision_sites, provision_devices  # Site and device provisioning functions
+from src.provision import plan_provisioning, provision_sites, provision_devices  # Provisioning functions
+from src.provision import report_metrics  # Request metrics report
 
 
 # Main function
@@ -36,16 +38,32 @@ def main():
         except Exception as exception:
             logger.error(f"Exception: {exception}")
             raise exception
+        try:
+            # Only compute and print the API calls needed if requested
+            if args.plan:
+                if args.resume:
+                    mist.org.journal = Journal(filename=args.journal, org_id=mist.org.org_id, resume=True)
+                plan_provisioning(mist=mist, sites_csv=args.sites, devices_csv=args.devices, engine=args.engine,
+                                  concurrency=args.concurrency, upsert=args.upsert)
+                return
+
+            # Record every completed step so an interrupted run can be resumed
+            mist.org.journal = Journal(filename=args.journal, org_id=mist.org.org_id, resume=args.resume)
 
-        # Parse sites CSV and create sites if sites CSV file is specified
-        if args.sites:
-            sites = provision_sites(csv_file=args.sites, mist=mist)
-            logger.debug(f"Provisioned sit(s)e: {', '.join([s.name for s in sites])}")
+            # Parse sites CSV and create sites if sites CSV file is specified
+            if args.sites:
+                sites = provision_sites(csv_file=args.sites, mist=mist, engine=args.engine,
+                                        concurrency=args.concurrency, upsert=args.upsert)
+                logger.debug(f"Provisioned sit(s)e: {', '.join([s.name for s in sites])}")
 
-        # Parse devices and create devices if devices CSV file is specified
-        if args.devices:
-            devices = provision_devices(csv_file=args.devices, mist=mist)
-            logger.debug(f"Provisioned device(s): {', '.join([d.name for d in devices])}")
+            # Parse devices and create devices if devices CSV file is specified
+            if args.devices:
+                devices = provision_devices(csv_file=args.devices, mist=mist, engine=args.engine,
+                                            concurrency=args.concurrency)
+                logger.debug(f"Provisioned device(s): {', '.join([d.name for d in devices])}")
+        finally:
+            # Report where the time went, for failed runs too
+            report_metrics(mist=mist, json_file=args.metrics_json, prometheus_file=args.metrics_prometheus)
 
 
 # Only run this section if being run as a script, not imported.
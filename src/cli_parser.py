@@ -61,6 +61,47 @@ def cli_parser() -> argparse.Namespace:
                            metavar="CSV file",
                            required=False,
                            help="Path to the CSV file of devices (default: %(default)s)")
+    # Add flag argument to the provision positional argument for the execution engine
+    # Default to "serial"
+    provision.add_argument('--engine',
+                           choices=['serial', 'threads'],
+                           default="serial",
+                           help="Execution engine used to provision sites and devices (default: %(default)s)")
+    # Add flag argument to the provision positional argument for the number of sites or devices in flight
+    # Default to 10
+    provision.add_argument('--concurrency',
+                           type=int,
+                           default=10,
+                           metavar="N",
+                           help="Maximum number of sites or devices provisioned at once (default: %(default)s)")
+    # Add flag argument to the provision positional argument for the journal of completed steps
+    # Default to "./mist_provisioning.journal"
+    provision.add_argument('--journal',
+                           default="./mist_provisioning.journal",
+                           metavar="FILE",
+                           help="Path to the journal of completed provisioning steps (default: %(default)s)")
+    # Add flag argument to the provision positional argument to resume an interrupted run from the journal
+    provision.add_argument('--resume',
+                           action='store_true',
+                           help="Skip the steps completed by a previous run recorded in the journal")
+    # Add flag argument to the provision positional argument to update existing sites instead of creating them
+    provision.add_argument('--upsert',
+                           action='store_true',
+                           help="Update the existing sites with the same name, only sending the fields that changed")
+    # Add flag argument to the provision positional argument to only plan the API calls
+    provision.add_argument('--plan',
+                           action='store_true',
+                           help="Print the API calls needed and an estimate of the run time without changing anything")
+    # Add flag argument to the provision positional argument to export the request metrics as JSON
+    provision.add_argument('--metrics-json',
+                           type=Path,
+                           metavar="FILE",
+                           help="Write a JSON summary of the requests sent by endpoint at the end of the run")
+    # Add flag argument to the provision positional argument to export the request metrics for Prometheus
+    provision.add_argument('--metrics-prometheus',
+                           type=Path,
+                           metavar="FILE",
+                           help="Write the request metrics to a Prometheus text file at the end of the run")
     # Parse the cli arguments into a namespace object and return it
     arguments = cli.parse_args()
 
@@ -0,0 +1,88 @@
+# Standard library imports
+from typing import AnyStr, Optional  # https://docs.python.org/3/library/typing.html?highlight=typing#module-typing
+from pathlib import Path  # https://docs.python.org/3/library/pathlib.html?highlight=pathlib#module-pathlib
+from threading import Lock  # https://docs.python.org/3/library/threading.html#lock-objects
+import sqlite3  # https://docs.python.org/3/library/sqlite3.html
+import time
+# Module imports
+from src import logger  # Custom logging object
+from src.utils import GeoInfo, normalize_address  # Geocoding result and address normalization
+
+
+class GeoCache(object):
+    """
+    Persistent SQLite cache of geocoding and timezone lookups, keyed by normalized address
+    Example:
+        In [1]: cache = GeoCache(filename="geocache.sqlite", ttl=86400)
+
+        In [2]: cache.get("23702 Via Lupona, Santa Clarita, CA 91355")
+        Out[2]: GeoInfo(lat=34.4, lng=-118.5, country='US', address='23702 Via Lupona, ...', timezone='America/Los_Angeles')
+    """
+
+    file: Path
+    ttl: int = 2592000
+    max_entries: int = 100000
+
+    def __init__(self, filename: AnyStr, ttl: int = 2592000, max_entries: int = 100000):
+        """ Geocoding cache initialization
+
+        :param AnyStr filename: The path of the SQLite database file (either relative or absolute)
+        :param int ttl: Number of seconds a cached entry stays valid
+        :param int max_entries: Maximum number of entries kept, the least recently used are evicted first
+        """
+        self.file = Path(filename).expanduser().absolute()
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.__lock = Lock()
+        self.__db = sqlite3.connect(str(self.file), check_same_thread=False)
+        with self.__lock, self.__db:
+            self.__db.execute("CREATE TABLE IF NOT EXISTS geocache ("
+                              "address TEXT PRIMARY KEY, lat REAL, lng REAL, country TEXT, "
+                              "formatted_address TEXT, timezone TEXT, created REAL, accessed REAL)")
+            self.__db.execute("CREATE INDEX IF NOT EXISTS geocache_accessed ON geocache (accessed)")
+            self.__db.execute("DELETE FROM geocache WHERE created < ?", (time.time() - self.ttl,))
+        logger.debug(f"Opened geocoding cache {self.file} with {len(self)} entries.")
+
+    def get(self, address: str) -> Optional[GeoInfo]:
+        """ Retrieve the cached location of an address
+
+        :param str address: The address as written in the CSV file
+        :return Optional[GeoInfo]: The cached location, None if it is missing or expired
+        """
+        key = normalize_address(address)
+        now = time.time()
+        with self.__lock, self.__db:
+            row = self.__db.execute("SELECT lat, lng, country, formatted_address, timezone FROM geocache "
+                                    "WHERE address = ? AND created >= ?", (key, now - self.ttl)).fetchone()
+            if row is None:
+                return None
+            self.__db.execute("UPDATE geocache SET accessed = ? WHERE address = ?", (now, key))
+        return GeoInfo(*row)
+
+    def set(self, address: str, geo_info: GeoInfo):
+        """ Store the location of an address and evict the least recently used entries above the size limit
+
+        :param str address: The address as written in the CSV file
+        :param GeoInfo geo_info: The resolved location of the address
+        """
+        key = normalize_address(address)
+        now = time.time()
+        with self.__lock, self.__db:
+            self.__db.execute("INSERT OR REPLACE INTO geocache VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                              (key, geo_info.lat, geo_info.lng, geo_info.country, geo_info.address,
+                               geo_info.timezone, now, now))
+            count = self.__db.execute("SELECT COUNT(*) FROM geocache").fetchone()[0]
+            if count > self.max_entries:
+                self.__db.execute("DELETE FROM geocache WHERE address IN (SELECT address FROM geocache "
+                                  "ORDER BY accessed LIMIT ?)", (count - self.max_entries,))
+
+    def close(self):
+        with self.__lock:
+            self.__db.close()
+
+    def __len__(self) -> int:
+        with self.__lock:
+            return self.__db.execute("SELECT COUNT(*) FROM geocache").fetchone()[0]
+
+    def __str__(self):
+        return f"<{self.__class__.__name__} object - File: '{self.file}'>"
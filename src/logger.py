@@ -1,6 +1,6 @@
 import logging  # https://docs.python.org/3/library/logging.html?highlight=logging#module-logging
 from sys import stdout
-file_log_fmt = '%(asctime)s [%(levelname)-7s][%(name)s]: %(message)s'
+file_log_fmt = '%(asctime)s [%(levelname)-7s][%(name)s][%(threadName)s]: %(message)s'
 console_log_fmt = '[%(module)-6s - %(funcName)-12s: %(lineno)-3d][%(levelname)-7s] %(message)s'
 date_fmt = "%Y-%m-%d %H:%M:%S %Z"
 
@@ -1,22 +1,81 @@
 # Standard library imports
-from typing import List  # https://docs.python.org/3/library/typing.html?highlight=typing#module-typing
+from typing import List, Optional  # https://docs.python.org/3/library/typing.html?highlight=typing#module-typing
 from pathlib import Path  # https://docs.python.org/3/library/pathlib.html?highlight=pathlib#module-pathlib
+from time import monotonic  # https://docs.python.org/3/library/time.html#time.monotonic
 # Internal imports
 from mist import Mist  # Mist object
 from mist.site import Site  # Mist Site object
 from mist.accesspoint import AccessPoint  # Mist Access Point object
+from mist.plan import Plan  # Provisioning plan
 from src import logger  # Custom logging object
 
 
-def provision_sites(csv_file: Path, mist: Mist) -> List[Site]:
+def provision_sites(csv_file: Path, mist: Mist, engine: str = "serial", concurrency: int = 1,
+                    upsert: bool = False) -> List[Site]:
     logger.info(f"Creating sites from csv file {csv_file.name}...")
-    new_sites, created = mist.org.create_sites(csv_file=csv_file)
+    new_sites, created = mist.org.create_sites(csv_file=csv_file, engine=engine, concurrency=concurrency,
+                                               upsert=upsert)
     logger.info(f"Provisioned {created} sites.")
+    log_api_usage(mist=mist)
     return new_sites
 
 
-def provision_devices(csv_file: Path, mist: Mist) -> List[AccessPoint]:
+def provision_devices(csv_file: Path, mist: Mist, engine: str = "serial", concurrency: int = 1) -> List[AccessPoint]:
     logger.info(f"Creating devices and assigning to sites from csv file {csv_file.name}...")
-    new_devices, assigned = mist.org.assign_devices_from_csv(csv_file=csv_file)
+    new_devices, assigned = mist.org.assign_devices_from_csv(csv_file=csv_file, engine=engine,
+                                                              concurrency=concurrency)
     logger.info(f"Claimed and/or assigned {assigned} devices.")
+    log_api_usage(mist=mist)
     return new_devices
+
+
+def plan_provisioning(mist: Mist, sites_csv: Optional[Path] = None, devices_csv: Optional[Path] = None,
+                      engine: str = "serial", concurrency: int = 1, upsert: bool = False) -> Plan:
+    logger.info("Planning the API calls needed, nothing will be changed...")
+    plan = mist.org.plan(sites_csv=sites_csv, devices_csv=devices_csv, upsert=upsert)
+    for operation in plan.operations:
+        logger.info(f"[{operation.stage}] {operation.method} {operation.url} - {operation.target}")
+    for skipped in plan.skipped:
+        logger.info(f"[skip] {skipped}")
+    # Time a single call to estimate the latency of the Mist API
+    start = monotonic()
+    mist.api.http_get__()
+    latency = monotonic() - start
+    used, limit = mist.api.rate_limiter.usage()
+    seconds = plan.estimate(latency=latency, concurrency=concurrency if engine != "serial" else 1,
+                            geocode_concurrency=mist.api.geocode_concurrency, hourly_limit=limit, used=used,
+                            pacing_start=mist.api.rate_limiter.pacing_start)
+    summary = ", ".join(f"{calls} {stage}" for stage, calls in plan.summary().items() if calls)
+    logger.info(f"Plan: {plan.calls()} Mist API calls and {len(plan) - plan.calls()} Google API calls "
+                f"({summary or 'nothing to do'}), {len(plan.skipped)} steps skipped.")
+    logger.info(f"Estimated run time: {seconds:.1f}s with the {engine} engine at {latency * 1000:.0f}ms per call.")
+    return plan
+
+
+def log_api_usage(mist: Mist):
+    used, limit = mist.api.rate_limiter.usage()
+    logger.info(f"Used {used} of {limit} Mist API calls allowed per hour, retried {mist.api.retry_policy.retries} "
+                f"failed requests and {mist.api.rate_limiter.retries} rate limited requests.")
+
+
+def report_metrics(mist: Mist, json_file: Optional[Path] = None, prometheus_file: Optional[Path] = None):
+    """
+    Log the request metrics of the run by endpoint and export them
+
+    :param Mist mist: The Mist object the requests were sent with
+    :param Optional[Path] json_file: Path of the JSON summary written if set
+    :param Optional[Path] prometheus_file: Path of the Prometheus text file written if set
+    """
+    metrics = mist.api.metrics
+    for endpoint in metrics.endpoints:
+        p50, p99 = (endpoint.quantile(q) or 0 for q in (0.5, 0.99))
+        logger.info(f"{endpoint.method} {endpoint.endpoint}: {endpoint.requests} requests, "
+                    f"p50 {p50 * 1000:.0f}ms, p99 {p99 * 1000:.0f}ms, "
+                    f"{endpoint.errors} errors, {endpoint.retries} retries, "
+                    f"{endpoint.bytes_sent} bytes sent, {endpoint.bytes_received} bytes received.")
+    if json_file:
+        metrics.write_json(json_file)
+        logger.info(f"Wrote the request metrics to {json_file}.")
+    if prometheus_file:
+        metrics.write_prometheus(prometheus_file)
+        logger.info(f"Wrote the request metrics in the Prometheus format to {prometheus_file}.")
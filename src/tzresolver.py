@@ -0,0 +1,103 @@
+# Standard library imports
+from typing import AnyStr, Dict, List, Optional, Tuple  # https://docs.python.org/3/library/typing.html?highlight=typing#module-typing
+from pathlib import Path  # https://docs.python.org/3/library/pathlib.html?highlight=pathlib#module-pathlib
+import json  # https://docs.python.org/3/library/json.html
+import math
+# Module imports
+from src import logger  # Custom logging object
+
+Ring = List[Tuple[float, float]]
+
+
+class TimezoneResolver(object):
+    """
+    Offline IANA timezone lookup from a GeoJSON file of timezone boundaries, such as the releases of
+    https://github.com/evansiroky/timezone-boundary-builder
+    Example:
+        In [1]: resolver = TimezoneResolver(filename="combined.json")
+
+        In [2]: resolver.resolve(lat=34.4, lng=-118.5)
+        Out[2]: 'America/Los_Angeles'
+    """
+
+    file: Path
+    cell_size: float = 1.0
+
+    def __init__(self, filename: AnyStr, cell_size: float = 1.0):
+        """ Timezone resolver initialization
+
+        :param AnyStr filename: The path of the GeoJSON boundary file (either relative or absolute)
+        :param float cell_size: Size in degrees of the cells of the spatial grid index
+        """
+        self.file = Path(filename).expanduser().absolute()
+        self.cell_size = cell_size
+        # Every polygon is stored once as (tzid, bounding box, outer ring, holes)
+        self.__polygons = list()
+        # Spatial grid index mapping a cell to the polygons whose bounding box overlaps it
+        self.__grid: Dict[Tuple[int, int], List[int]] = dict()
+        with self.file.open() as boundaries_stream:
+            boundaries = json.load(boundaries_stream)
+        for feature in boundaries.get('features', []):
+            properties = feature.get('properties') or {}
+            tzid = properties.get('tzid') or properties.get('TZID')
+            geometry = feature.get('geometry') or {}
+            if geometry.get('type') == 'Polygon':
+                polygons = [geometry['coordinates']]
+            elif geometry.get('type') == 'MultiPolygon':
+                polygons = geometry['coordinates']
+            else:
+                continue
+            for rings in polygons:
+                self.__add_polygon(tzid, [[(point[0], point[1]) for point in ring] for ring in rings])
+        logger.debug(f"Loaded {len(self.__polygons)} timezone polygons from {self.file}.")
+
+    def __add_polygon(self, tzid: str, rings: List[Ring]):
+        outer = rings[0]
+        min_lng = min(point[0] for point in outer)
+        max_lng = max(point[0] for point in outer)
+        min_lat = min(point[1] for point in outer)
+        max_lat = max(point[1] for point in outer)
+        idx = len(self.__polygons)
+        self.__polygons.append((tzid, (min_lng, min_lat, max_lng, max_lat), outer, rings[1:]))
+        for x in range(self.__cell(min_lng), self.__cell(max_lng) + 1):
+            for y in range(self.__cell(min_lat), self.__cell(max_lat) + 1):
+                self.__grid.setdefault((x, y), list()).append(idx)
+
+    def __cell(self, degrees: float) -> int:
+        return int(math.floor(degrees / self.cell_size))
+
+    @staticmethod
+    def __contains(ring: Ring, lng: float, lat: float) -> bool:
+        # Ray casting, counting the edges crossed by a ray going east from the point
+        inside = False
+        j = len(ring) - 1
+        for i in range(len(ring)):
+            xi, yi = ring[i]
+            xj, yj = ring[j]
+            if (yi > lat) != (yj > lat) and lng < (xj - xi) * (lat - yi) / (yj - yi) + xi:
+                inside = not inside
+            j = i
+        return inside
+
+    def resolve(self, lat: float, lng: float) -> Optional[str]:
+        """ Find the IANA timezone ID of a location
+
+        :param float lat: Latitude of the location
+        :param float lng: Longitude of the location
+        :return Optional[str]: The timezone ID, None if the location is not covered by the boundary file
+        """
+        if lat is None or lng is None:
+            return None
+        for idx in self.__grid.get((self.__cell(lng), self.__cell(lat)), []):
+            tzid, (min_lng, min_lat, max_lng, max_lat), outer, holes = self.__polygons[idx]
+            if not (min_lng <= lng <= max_lng and min_lat <= lat <= max_lat):
+                continue
+            if self.__contains(outer, lng, lat) and not any(self.__contains(hole, lng, lat) for hole in holes):
+                return tzid
+        return None
+
+    def __len__(self) -> int:
+        return len(self.__polygons)
+
+    def __str__(self):
+        return f"<{self.__class__.__name__} object - File: '{self.file}', Polygons: {len(self.__polygons)}>"
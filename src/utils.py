@@ -1,52 +1,107 @@
 # Standard library imports
-from typing import AnyStr, Dict, List, Optional  # https://docs.python.org/3/library/typing.html?highlight=typing#module-typing
+from typing import AnyStr, Dict, Iterable, Iterator, List, NamedTuple, Optional  # https://docs.python.org/3/library/typing.html?highlight=typing#module-typing
 import csv  # https://docs.python.org/3/library/csv.html?highlight=csv#module-csv
+from itertools import islice  # https://docs.python.org/3/library/itertools.html#itertools.islice
 from pathlib import Path  # https://docs.python.org/3/library/pathlib.html?highlight=pathlib#module-pathlib
+import re
 import time
 # External imports
 import geocoder
 import requests
 # Module imports
-from src import logger  # Custom logging object
+from src.tzresolver import TimezoneResolver  # Offline timezone lookup
 
+# Base URL of the Google Geocoding and Time Zone APIs, overridden by the `base_url` option of the `google` section
+GOOGLE_BASE_URL = "https://maps.googleapis.com"
 
-def parse_csv_file(csv_file: AnyStr) -> List[Dict]:
+
+def iter_csv_file(csv_file: AnyStr) -> Iterator[Dict]:
+    """ Stream the rows of a CSV file, empty values are converted to None
+
+    :param AnyStr csv_file: The path of the CSV file (either relative or absolute)
+    :return Iterator[Dict]: The rows of the CSV file, read one at a time
+    """
     csv_path = Path(csv_file).expanduser().absolute()
-    csv_data = list()
     with csv_path.open('r') as csv_stream:
         data = csv.DictReader(csv_stream)
         for row in data:
             for k, v in row.items():
-                if len(row[k]) == 0:
+                if v is not None and len(v) == 0:
                     row[k] = None
-            csv_data.append(row)
-    return csv_data
+            yield row
 
 
-def find_mist_object_id_by_name(name: AnyStr, objects: List) -> Optional[AnyStr]:
-    name = name.strip()
-    objects = [m.to_mist for m in objects]
-    try:
-        match = next(o for o in objects if o['name'] == name)
-    except Exception as e:
-        logger.error(f"Could not match object named '{name}' with anything in the list of objects provided.")
-        logger.error(f"Exception: {e}")
-        return None
-    if match:
-        return match['id']
-    else:
-        return None
-
-
-def get_geo_info(address: str, api_key: str) -> (geocoder.google, dict):
-    try:
-        gaddr = geocoder.google(address, key=api_key)
-    except Exception:
-        raise
-    tz_url = f"https://maps.googleapis.com/maps/api/timezone/json?location={gaddr.lat},{gaddr.lng}&timestamp={int(time.time())}&key={api_key}"
+def parse_csv_file(csv_file: AnyStr) -> List[Dict]:
+    return list(iter_csv_file(csv_file))
+
+
+def chunked(iterable: Iterable, size: int) -> Iterator[List]:
+    """ Split an iterable into lists of at most `size` items, consuming it lazily
+
+    :param Iterable iterable: The items to split
+    :param int size: Maximum number of items per chunk
+    :return Iterator[List]: The chunks, in order
+    """
+    iterator = iter(iterable)
+    while True:
+        chunk = list(islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+class GeoInfo(NamedTuple):
+    """ Location of an address resolved with the Google Geocoding and Time Zone APIs """
+    lat: Optional[float]
+    lng: Optional[float]
+    country: Optional[str]
+    address: Optional[str]
+    timezone: Optional[str]
+
+
+def normalize_address(address: str) -> str:
+    """ Normalize an address so different spellings of the same address share one cache entry
+
+    :param str address: The address as written in the CSV file
+    :return str: The lowercase address with collapsed whitespace and separators
+    """
+    address = re.sub(r"\s*,\s*", ", ", address.strip().lower())
+    return re.sub(r"\s+", " ", address).strip(" ,.")
+
+
+def get_geo_info(address: str, api_key: str, session: requests.Session = None, timeout: (float, float) = None,
+                 tz_resolver: TimezoneResolver = None, base_url: str = GOOGLE_BASE_URL) -> GeoInfo:
+    if session is None:
+        session = requests.Session()
     try:
-        tz_res = requests.get(url=tz_url)
+        # The session applies the configured Google rate limit, the fixed limits of geocoder (10 queries per second
+        # and 2500 per day per process) are turned off
+        gaddr = geocoder.google(address, key=api_key, session=session, timeout=timeout,
+                                url=f"{base_url}/maps/api/geocode/json", rate_limit=False)
     except Exception:
         raise
-    tz_data = tz_res.json()
-    return gaddr, tz_data
+    # Connection failures and server errors are raised so they can be retried, other errors mean no result
+    if gaddr.error and not (isinstance(gaddr.status_code, int) and gaddr.status_code < 500):
+        raise ConnectionError(f"Geocoding request failed: {gaddr.error}")
+    timezone = get_timezone(lat=gaddr.lat, lng=gaddr.lng, api_key=api_key, session=session, timeout=timeout,
+                            tz_resolver=tz_resolver, base_url=base_url)
+    return GeoInfo(lat=gaddr.lat, lng=gaddr.lng, country=gaddr.country, address=gaddr.address, timezone=timezone)
+
+
+def get_timezone(lat: float, lng: float, api_key: str, session: requests.Session = None,
+                 timeout: (float, float) = None, tz_resolver: TimezoneResolver = None,
+                 base_url: str = GOOGLE_BASE_URL) -> Optional[str]:
+    if session is None:
+        session = requests.Session()
+    # Resolve the timezone offline when possible, the Google Time Zone API is only a fallback
+    timezone = tz_resolver.resolve(lat=lat, lng=lng) if tz_resolver is not None else None
+    if timezone is None:
+        tz_url = f"{base_url}/maps/api/timezone/json?location={lat},{lng}&timestamp={int(time.time())}&key={api_key}"
+        try:
+            tz_res = session.get(url=tz_url, timeout=timeout)
+        except Exception:
+            raise
+        if tz_res.status_code >= 500:
+            raise ConnectionError(f"Time zone request failed: {tz_res.status_code} - {tz_res.content}")
+        timezone = tz_res.json().get('timeZoneId')
+    return timezone